@@ -0,0 +1,261 @@
+# airport_index.py - Compact, memory-mappable airport index built from airports.csv
+#
+# Build once with:
+#     python airport_index.py build --csv airports.csv --out airports.idx
+#
+# File layout (little-endian, every array 8-byte aligned):
+#     header    magic, count, ident width, grid cell size, grid rows/cols
+#     idents    count x S<width>, sorted
+#     lat, lon  count x float64, in ident order
+#     types     count x uint8 (index into AIRPORT_TYPES)
+#     cell_ids  count x uint32, airport rows ordered by grid cell
+#     cell_ptr  (rows * cols + 1) x uint32, start of each cell in cell_ids
+import argparse
+import csv
+import math
+import mmap
+import struct
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+MAGIC = b"AEROIDX1"
+HEADER = struct.Struct("<8sIIdII")
+AIRPORT_TYPES = ("large_airport", "medium_airport", "small_airport")
+GRID_CELL_DEG = 1.0
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEG = math.pi * EARTH_RADIUS_KM / 180.0
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def _grid_shape(cell_deg: float) -> Tuple[int, int]:
+    return math.ceil(180.0 / cell_deg), math.ceil(360.0 / cell_deg)
+
+
+def _cell_of(lat, lon, cell_deg: float, rows: int, cols: int):
+    row = np.clip(((np.asarray(lat) + 90.0) // cell_deg).astype(np.int64), 0, rows - 1)
+    col = np.clip(((np.asarray(lon) + 180.0) // cell_deg).astype(np.int64), 0, cols - 1)
+    return row, col
+
+
+def read_airports_csv(csv_path: str) -> List[Tuple[str, float, float, int]]:
+    airports = {}
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            if row.get("type") not in AIRPORT_TYPES:
+                continue
+            try:
+                lat, lon = float(row["latitude_deg"]), float(row["longitude_deg"])
+            except (KeyError, ValueError):
+                continue
+            ident = row["ident"].strip().upper()
+            if ident:
+                airports[ident] = (ident, lat, lon, AIRPORT_TYPES.index(row["type"]))
+    return sorted(airports.values())
+
+
+def build_index_bytes(airports: List[Tuple[str, float, float, int]], cell_deg: float = GRID_CELL_DEG) -> bytes:
+    """Serialises (ident, lat, lon, type) rows, which must be sorted by ident."""
+    count = len(airports)
+    width = max((len(a[0]) for a in airports), default=1)
+    idents = np.array([a[0].encode("ascii", "replace") for a in airports], dtype=f"S{width}")
+    lat = np.array([a[1] for a in airports], dtype="<f8")
+    lon = np.array([a[2] for a in airports], dtype="<f8")
+    types = np.array([a[3] for a in airports], dtype=np.uint8)
+    rows, cols = _grid_shape(cell_deg)
+    row, col = _cell_of(lat, lon, cell_deg, rows, cols)
+    cells = row * cols + col
+    cell_ids = np.argsort(cells, kind="stable").astype("<u4")
+    cell_ptr = np.zeros(rows * cols + 1, dtype="<u4")
+    np.cumsum(np.bincount(cells, minlength=rows * cols), out=cell_ptr[1:])
+
+    parts = [HEADER.pack(MAGIC, count, width, cell_deg, rows, cols)]
+    offset = HEADER.size
+    for array in (idents, lat, lon, types, cell_ids, cell_ptr):
+        padding = _align(offset) - offset
+        parts.append(b"\0" * padding + array.tobytes())
+        offset += padding + array.nbytes
+    return b"".join(parts)
+
+
+class AirportIndex:
+    """
+    Read-only ident -> (lat, lon) table with a lat/lon grid for spatial
+    queries. When loaded from a file the arrays are views over a shared
+    mmap, so every worker process reuses the same page-cache pages.
+    """
+
+    def __init__(self, buffer):
+        self._buffer = buffer
+        magic, count, width, cell_deg, rows, cols = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise ValueError("Not an AeroSentry airport index file")
+        self.count, self.cell_deg, self.rows, self.cols = count, cell_deg, rows, cols
+        offset = HEADER.size
+        arrays = []
+        for dtype, length in ((f"S{width}", count), ("<f8", count), ("<f8", count), (np.uint8, count),
+                              ("<u4", count), ("<u4", rows * cols + 1)):
+            offset = _align(offset)
+            array = np.frombuffer(buffer, dtype=dtype, count=length, offset=offset)
+            arrays.append(array)
+            offset += array.nbytes
+        self.idents, self.lat, self.lon, self.types, self.cell_ids, self.cell_ptr = arrays
+
+    @classmethod
+    def load(cls, path: str) -> "AirportIndex":
+        with open(path, "rb") as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    @classmethod
+    def from_csv(cls, csv_path: str) -> "AirportIndex":
+        return cls(build_index_bytes(read_airports_csv(csv_path)))
+
+    @classmethod
+    def empty(cls) -> "AirportIndex":
+        return cls(build_index_bytes([]))
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __contains__(self, ident: str) -> bool:
+        return self.find(ident) is not None
+
+    def find(self, ident: str) -> Optional[int]:
+        """Row of ``ident`` in the index, via binary search over the sorted idents."""
+        if not self.count:
+            return None
+        try:
+            key = ident.upper().encode("ascii")
+        except UnicodeEncodeError:
+            return None
+        row = int(np.searchsorted(self.idents, key))
+        if row < self.count and self.idents[row] == key:
+            return row
+        return None
+
+    def get(self, ident: str) -> Optional[Tuple[float, float]]:
+        row = self.find(ident)
+        if row is None:
+            return None
+        return float(self.lat[row]), float(self.lon[row])
+
+    def ident(self, row: int) -> str:
+        return self.idents[row].decode("ascii")
+
+    def _cell_rows(self, grid_row: int, grid_col: int) -> np.ndarray:
+        cell = grid_row * self.cols + grid_col % self.cols
+        return self.cell_ids[self.cell_ptr[cell]:self.cell_ptr[cell + 1]]
+
+    def _ring_rows(self, center_row: int, center_col: int, ring: int) -> np.ndarray:
+        """Airport rows in the square ring of grid cells ``ring`` cells from the centre."""
+        cells = []
+        for grid_row in range(center_row - ring, center_row + ring + 1):
+            if not 0 <= grid_row < self.rows:
+                continue
+            if abs(grid_row - center_row) == ring:
+                grid_cols = range(center_col - ring, center_col + ring + 1)
+            else:
+                grid_cols = (center_col - ring, center_col + ring)
+            cells.extend(self._cell_rows(grid_row, grid_col) for grid_col in grid_cols)
+        return np.concatenate(cells) if cells else np.array([], dtype=np.uint32)
+
+    def within(self, lat_min: float, lat_max: float, lon_min: float, lon_max: float,
+               max_type: int = len(AIRPORT_TYPES) - 1) -> np.ndarray:
+        """
+        Rows of the airports inside the box, at most ``max_type`` in
+        AIRPORT_TYPES order (0 = large only). ``lon_min > lon_max`` means the
+        box crosses the antimeridian.
+        """
+        if not self.count or lat_min > lat_max:
+            return np.array([], dtype=np.uint32)
+        row_lo, col_lo = (int(v) for v in _cell_of(lat_min, lon_min, self.cell_deg, self.rows, self.cols))
+        row_hi, col_hi = (int(v) for v in _cell_of(lat_max, lon_max, self.cell_deg, self.rows, self.cols))
+        col_ranges = [(col_lo, col_hi)] if lon_min <= lon_max else [(col_lo, self.cols - 1), (0, col_hi)]
+        # Cells of one grid row are contiguous in cell_ids, so each row is a single slice
+        slices = [
+            self.cell_ids[self.cell_ptr[grid_row * self.cols + first]:self.cell_ptr[grid_row * self.cols + last + 1]]
+            for grid_row in range(row_lo, row_hi + 1) for first, last in col_ranges
+        ]
+        rows = np.concatenate(slices) if slices else np.array([], dtype=np.uint32)
+        lat, lon = self.lat[rows], self.lon[rows]
+        in_lon = (lon >= lon_min) & (lon <= lon_max) if lon_min <= lon_max else (lon >= lon_min) | (lon <= lon_max)
+        return np.sort(rows[(lat >= lat_min) & (lat <= lat_max) & in_lon & (self.types[rows] <= max_type)])
+
+    def nearest(self, lat: float, lon: float, k: int = 1, max_km: float = 1000.0) -> List[Dict]:
+        """
+        The ``k`` airports nearest to (lat, lon) within ``max_km``, searching
+        grid rings outward until no unvisited cell can hold a closer one.
+        """
+        center_row, center_col = (int(v) for v in _cell_of(lat, lon, self.cell_deg, self.rows, self.cols))
+        found_rows, found_dist, kth = [], [], math.inf
+        for ring in range(max(self.rows, self.cols) // 2 + 1):
+            # Closest any cell of this ring can be, allowing for meridians converging
+            ring_lat = min(89.9, abs(lat) + ring * self.cell_deg)
+            lower_bound = max(ring - 1, 0) * self.cell_deg * KM_PER_DEG * math.cos(math.radians(ring_lat))
+            if lower_bound > min(max_km, kth):
+                break
+            rows = self._ring_rows(center_row, center_col, ring)
+            if len(rows):
+                found_rows.append(rows)
+                found_dist.append(self._distance_km(lat, lon, rows))
+                distances = np.concatenate(found_dist)
+                if len(distances) >= k:
+                    kth = float(np.partition(distances, k - 1)[k - 1])
+        if not found_rows:
+            return []
+        # Rings wrap around the antimeridian, so a cell can be visited twice
+        rows, first = np.unique(np.concatenate(found_rows), return_index=True)
+        distances = np.concatenate(found_dist)[first]
+        order = np.argsort(distances)[:k]
+        return [
+            {"ident": self.ident(rows[i]), "lat": float(self.lat[rows[i]]), "lon": float(self.lon[rows[i]]),
+             "type": AIRPORT_TYPES[self.types[rows[i]]], "distance_km": round(float(distances[i]), 1)}
+            for i in order if distances[i] <= max_km
+        ]
+
+    def _distance_km(self, lat: float, lon: float, rows: np.ndarray) -> np.ndarray:
+        lat1, lon1 = math.radians(lat), math.radians(lon)
+        lat2, lon2 = np.radians(self.lat[rows]), np.radians(self.lon[rows])
+        a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def load_airport_index(index_path: str = "airports.idx", csv_path: str = "airports.csv") -> AirportIndex:
+    """Prefers the prebuilt index; falls back to parsing the CSV in memory."""
+    try:
+        index = AirportIndex.load(index_path)
+        print(f"✅ Loaded airport index {index_path} ({len(index)} airports).")
+        return index
+    except FileNotFoundError:
+        pass
+    try:
+        index = AirportIndex.from_csv(csv_path)
+        print(f"⚠️ {index_path} not found; built airport index from {csv_path} ({len(index)} airports). "
+              f"Run 'python airport_index.py build' to precompile it.")
+        return index
+    except Exception as e:
+        print(f"❌ Failed to load airports: {e}")
+        return AirportIndex.empty()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AeroSentry airport index tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Compile airports.csv into a memory-mappable index")
+    build.add_argument("--csv", default="airports.csv")
+    build.add_argument("--out", default="airports.idx")
+    build.add_argument("--cell-deg", type=float, default=GRID_CELL_DEG)
+    args = parser.parse_args()
+
+    airports = read_airports_csv(args.csv)
+    data = build_index_bytes(airports, args.cell_deg)
+    with open(args.out, "wb") as f:
+        f.write(data)
+    print(f"✅ Wrote {args.out}: {len(airports)} airports, {len(data) / 1024:.0f} KiB.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+# analytics.py - Briefing event pipeline behind /admin/analytics
+#
+# The request path only appends a tuple to a bounded deque. A background
+# task drains it in batches, folds the events into rolling counters, a
+# count-min sketch and latency histograms, and appends them to SQLite (WAL).
+#
+# Under run_backend.py every worker runs its own pipeline, so each flush
+# also upserts that worker's touched minute/hour buckets and daily top
+# airports into shared rollup tables. summary() reads those back summed
+# across workers; only without a database does it fall back to the
+# in-memory buckets of the worker that answered.
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from metrics import Histogram
+
+EVENT_BUFFER_SIZE = 65536
+FLUSH_INTERVAL_SECONDS = 2.0
+MINUTE_RETENTION = 24 * 60
+HOUR_RETENTION = 7 * 24
+TOP_K = 10
+SKETCH_WIDTH = 2048
+SKETCH_DEPTH = 4
+LATENCY_MS_BUCKETS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 15000)
+LATENCY_STAGES = ("total", "upstream", "route")
+
+# (ts, departure, destination, risk, hazard_hit, rerouted, total_ms, upstream_ms, route_ms)
+Event = Tuple[float, str, str, str, bool, bool, float, float, float]
+
+
+class CountMinSketch:
+    def __init__(self, width: int = SKETCH_WIDTH, depth: int = SKETCH_DEPTH):
+        self.width, self.depth = width, depth
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        self._rows = np.arange(depth)
+
+    def _columns(self, key: str) -> np.ndarray:
+        return np.array([hash((seed, key)) % self.width for seed in range(self.depth)])
+
+    def add(self, key: str, count: int = 1) -> int:
+        """Adds ``count`` and returns the new estimate for ``key``."""
+        columns = self._columns(key)
+        self.table[self._rows, columns] += count
+        return int(self.table[self._rows, columns].min())
+
+
+class TopKCounter:
+    """Heavy hitters: a count-min sketch plus the k best-estimated keys."""
+
+    def __init__(self, k: int = TOP_K):
+        self.k = k
+        self.sketch = CountMinSketch()
+        self.top: Dict[str, int] = {}
+
+    def add(self, key: str, count: int = 1):
+        estimate = self.sketch.add(key, count)
+        if key in self.top or len(self.top) < self.k:
+            self.top[key] = estimate
+            return
+        weakest = min(self.top, key=self.top.get)
+        if estimate > self.top[weakest]:
+            del self.top[weakest]
+            self.top[key] = estimate
+
+    def most_common(self) -> List[Tuple[str, int]]:
+        return sorted(self.top.items(), key=lambda kv: -kv[1])
+
+
+class WindowBucket:
+    __slots__ = ("briefings", "hazards", "reroutes", "latency")
+
+    def __init__(self):
+        self.briefings = self.hazards = self.reroutes = 0
+        self.latency = {stage: Histogram(LATENCY_MS_BUCKETS) for stage in LATENCY_STAGES}
+
+    def add(self, event: Event):
+        self.briefings += 1
+        self.hazards += event[4]
+        self.reroutes += event[5]
+        for stage, value in zip(LATENCY_STAGES, event[6:9]):
+            self.latency[stage].observe(value)
+
+    def merge(self, other: "WindowBucket"):
+        self.briefings += other.briefings
+        self.hazards += other.hazards
+        self.reroutes += other.reroutes
+        for stage in LATENCY_STAGES:
+            self.latency[stage].merge(other.latency[stage])
+
+    def to_row(self) -> Tuple[int, int, int, str]:
+        latency = {stage: [hist.counts, hist.sum] for stage, hist in self.latency.items()}
+        return self.briefings, self.hazards, self.reroutes, json.dumps(latency, separators=(",", ":"))
+
+    @classmethod
+    def from_row(cls, briefings: int, hazards: int, reroutes: int, latency: str) -> "WindowBucket":
+        bucket = cls()
+        bucket.briefings, bucket.hazards, bucket.reroutes = briefings, hazards, reroutes
+        for stage, (counts, total) in json.loads(latency).items():
+            hist = bucket.latency[stage]
+            hist.counts, hist.count, hist.sum = list(counts), sum(counts), total
+        return bucket
+
+
+class AnalyticsPipeline:
+    def __init__(self, db_path: Optional[str] = "analytics.db"):
+        self.db_path = db_path
+        self._events: deque = deque(maxlen=EVENT_BUFFER_SIZE)
+        self._minutes: Dict[int, WindowBucket] = {}
+        self._hours: Dict[int, WindowBucket] = {}
+        self._airports_day: Optional[str] = None
+        self._airports = TopKCounter()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_pid: Optional[int] = None
+        self._reader: Optional[sqlite3.Connection] = None
+        self._reader_pid: Optional[int] = None
+        self._worker_id = ""
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"recorded": 0, "flushed": 0, "flush_errors": 0}
+
+    def record(self, departure: str, destination: str, risk: str, hazard_hit: bool, rerouted: bool,
+               total_ms: float, upstream_ms: float, route_ms: float):
+        # Hot path: deque.append is atomic under the GIL and drops the oldest event when full
+        self._events.append((time.time(), departure, destination, risk, hazard_hit, rerouted,
+                             total_ms, upstream_ms, route_ms))
+        self.stats["recorded"] += 1
+
+    def _drain(self) -> List[Event]:
+        batch = []
+        try:
+            while True:
+                batch.append(self._events.popleft())
+        except IndexError:
+            return batch
+
+    def _aggregate(self, batch: List[Event]) -> Tuple[set, set]:
+        """Folds ``batch`` into the buckets; returns the minute and hour keys it touched."""
+        minutes, hours = set(), set()
+        for event in batch:
+            ts = event[0]
+            day = datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%d")
+            if day != self._airports_day:
+                self._airports_day, self._airports = day, TopKCounter()
+            self._airports.add(event[1])
+            self._airports.add(event[2])
+            minute, hour = int(ts // 60), int(ts // 3600)
+            self._minutes.setdefault(minute, WindowBucket()).add(event)
+            self._hours.setdefault(hour, WindowBucket()).add(event)
+            minutes.add(minute)
+            hours.add(hour)
+        now = time.time()
+        for buckets, key_now, retention in ((self._minutes, int(now // 60), MINUTE_RETENTION),
+                                            (self._hours, int(now // 3600), HOUR_RETENTION)):
+            for key in [k for k in buckets if k <= key_now - retention]:
+                del buckets[key]
+        return minutes, hours
+
+    def _rollup_rows(self, minutes: set, hours: set) -> list:
+        # Built on the event loop, so the thread doing the write never sees a bucket mid-update
+        return [(60, key, *self._minutes[key].to_row()) for key in minutes if key in self._minutes] + \
+               [(3600, key, *self._hours[key].to_row()) for key in hours if key in self._hours]
+
+    def _open(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.db_path, check_same_thread=False, timeout=10.0)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        with db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS briefing_events (ts REAL, departure TEXT, destination TEXT, risk TEXT, "
+                "hazard_hit INTEGER, rerouted INTEGER, total_ms REAL, upstream_ms REAL, route_ms REAL)"
+            )
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS briefing_rollups (period INTEGER, bucket INTEGER, worker TEXT, "
+                "briefings INTEGER, hazards INTEGER, reroutes INTEGER, latency TEXT, "
+                "PRIMARY KEY (period, bucket, worker))"
+            )
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS airport_rollups (day TEXT, worker TEXT, airport TEXT, briefings INTEGER, "
+                "PRIMARY KEY (day, worker, airport))"
+            )
+        return db
+
+    def _write(self, batch: List[Event], rollups: list, airports_day: Optional[str], top_airports: list):
+        if self.db_path is None:
+            return
+        # A connection must not cross a fork: each worker opens its own and writes under its own id
+        if self._db is None or self._db_pid != os.getpid():
+            self._db, self._db_pid = self._open(), os.getpid()
+            self._worker_id = f"{self._db_pid}-{int(time.time() * 1000)}"
+        now = time.time()
+        with self._db:
+            self._db.executemany("INSERT INTO briefing_events VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", batch)
+            self._db.executemany("INSERT OR REPLACE INTO briefing_rollups VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                 [(period, key, self._worker_id, *row) for period, key, *row in rollups])
+            self._db.execute("DELETE FROM airport_rollups WHERE day = ? AND worker = ?", (airports_day, self._worker_id))
+            self._db.executemany("INSERT INTO airport_rollups VALUES (?, ?, ?, ?)",
+                                 [(airports_day, self._worker_id, a, n) for a, n in top_airports])
+            self._db.execute("DELETE FROM briefing_rollups WHERE (period = 60 AND bucket <= ?) OR (period = 3600 AND bucket <= ?)",
+                             (int(now // 60) - MINUTE_RETENTION, int(now // 3600) - HOUR_RETENTION))
+            self._db.execute("DELETE FROM airport_rollups WHERE day < ?", (airports_day,))
+
+    async def flush(self):
+        batch = self._drain()
+        if not batch:
+            return
+        rollups = self._rollup_rows(*self._aggregate(batch))
+        try:
+            await asyncio.to_thread(self._write, batch, rollups, self._airports_day, self._airports.most_common())
+            self.stats["flushed"] += len(batch)
+        except sqlite3.Error as e:
+            self.stats["flush_errors"] += 1
+            print(f"Analytics flush failed: {e}")
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL_SECONDS)
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        for conn in (self._db, self._reader):
+            if conn is not None:
+                conn.close()
+        self._db = self._reader = None
+
+    @staticmethod
+    def _merge(buckets: List[WindowBucket]) -> dict:
+        latency = {stage: Histogram(LATENCY_MS_BUCKETS) for stage in LATENCY_STAGES}
+        for bucket in buckets:
+            for stage in LATENCY_STAGES:
+                latency[stage].merge(bucket.latency[stage])
+        return {
+            "briefings": sum(b.briefings for b in buckets),
+            "hazards_detected": sum(b.hazards for b in buckets),
+            "reroutes": sum(b.reroutes for b in buckets),
+            "latency_ms": {stage: hist.snapshot() for stage, hist in latency.items()},
+        }
+
+    def _read_shared(self) -> Tuple[Dict[int, WindowBucket], Dict[int, WindowBucket], List[Tuple[str, int]]]:
+        """Every worker's rollups for the reported windows, summed per bucket."""
+        if self._reader is None or self._reader_pid != os.getpid():
+            self._reader, self._reader_pid = self._open(), os.getpid()
+        now = time.time()
+        day = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        windows: Dict[int, Dict[int, WindowBucket]] = {60: {}, 3600: {}}
+        rows = self._reader.execute(
+            "SELECT period, bucket, briefings, hazards, reroutes, latency FROM briefing_rollups "
+            "WHERE (period = 60 AND bucket > ?) OR (period = 3600 AND bucket > ?)",
+            (int(now // 60) - MINUTE_RETENTION, int(now // 3600) - 24),
+        )
+        for period, key, *row in rows:
+            bucket = WindowBucket.from_row(*row)
+            if key in windows[period]:
+                windows[period][key].merge(bucket)
+            else:
+                windows[period][key] = bucket
+        top_airports = self._reader.execute(
+            "SELECT airport, SUM(briefings) AS n FROM airport_rollups WHERE day = ? "
+            "GROUP BY airport ORDER BY n DESC LIMIT ?", (day, TOP_K),
+        ).fetchall()
+        return windows[60], windows[3600], top_airports
+
+    async def summary(self) -> dict:
+        """
+        Rolling windows built only from pre-aggregated buckets: all workers'
+        from the shared rollup tables, or this worker's alone without a
+        database or when it cannot be read.
+        """
+        scope = "worker"
+        minutes, hours = self._minutes, self._hours
+        top_airports = self._airports.most_common() if self._airports_day else []
+        if self.db_path is not None:
+            try:
+                minutes, hours, top_airports = await asyncio.to_thread(self._read_shared)
+                scope = "all_workers"
+            except sqlite3.Error as e:
+                print(f"Analytics read failed, reporting this worker only: {e}")
+        now = time.time()
+        minute_now, hour_now = int(now // 60), int(now // 3600)
+        midnight = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+        today = self._merge([b for k, b in minutes.items() if k * 60 >= midnight])
+        return {
+            "scope": scope,
+            "today": today,
+            "last_hour": self._merge([b for k, b in minutes.items() if k > minute_now - 60]),
+            "last_24h": self._merge([b for k, b in hours.items() if k > hour_now - 24]),
+            "per_minute": [
+                {"minute": datetime.fromtimestamp(k * 60, timezone.utc).isoformat(), "briefings": b.briefings}
+                for k, b in sorted(minutes.items()) if k > minute_now - 60
+            ],
+            "top_airports": [{"airport": a, "briefings": n} for a, n in top_airports],
+            # Queue and flush counters are per process
+            "worker": {"pid": os.getpid(), "pending_events": len(self._events), **self.stats},
+        }
@@ -1,34 +1,52 @@
 # auth.py - Authentication and Authorization
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
 import jwt
 import datetime
 from typing import Optional, Dict
 from fastapi import HTTPException, status
 from pydantic import BaseModel
 
-# Secret key for JWT tokens (in production, use environment variable)
-SECRET_KEY = "aerosentry_secret_key_2024"
-ALGORITHM = "HS256"
+# Secret key for HS256 tokens; override with JWT_SECRET_KEY in production
+SECRET_KEY = os.environ.get("JWT_SECRET_KEY", "aerosentry_secret_key_2024")
+ALGORITHM = os.environ.get("JWT_ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# Asymmetric signing (EdDSA/RS256): the issuing node holds the private key,
+# every node verifies against the public keys in the local JWKS file.
+# Generate both with: python auth.py generate-keys
+JWT_PRIVATE_KEY_PATH = os.environ.get("JWT_PRIVATE_KEY_PATH", "jwt_private_key.pem")
+JWT_KEY_ID = os.environ.get("JWT_KEY_ID", "aerosentry-1")
+JWKS_PATH = os.environ.get("JWKS_PATH", "jwks.json")
+ASYMMETRIC_ALGORITHMS = {"EdDSA": "OKP", "RS256": "RSA"}
+
+VERIFIED_TOKEN_CACHE_SIZE = 10000
+PASSWORD_HASH_ITERATIONS = 200_000
+
 # User database (in production, use real database)
+# Passwords are stored as pbkdf2_sha256$<iterations>$<salt>$<hash>
 users_db = {
     "pilot1": {
         "username": "pilot1",
-        "password": "pilot123",  # In production, use hashed passwords
+        "password_hash": "pbkdf2_sha256$200000$hzWMGx6cYSdIqw6WfGLzqw==$BvlZ2ZduX8f76ZGR78ZtVPpNPTiowuupHVArInQjMqo=",
         "role": "pilot",
         "full_name": "John Pilot",
         "license_number": "PPL-12345"
     },
     "pilot2": {
-        "username": "pilot2", 
-        "password": "pilot123",
+        "username": "pilot2",
+        "password_hash": "pbkdf2_sha256$200000$HIV4jCBpioY6gCHHxMuu/g==$82Hr6ucfcVpBTBn9FOuTPza4/gLJov329zNJBF9Fwdg=",
         "role": "pilot",
         "full_name": "Jane Aviator",
         "license_number": "CPL-67890"
     },
     "admin": {
         "username": "admin",
-        "password": "admin123",
+        "password_hash": "pbkdf2_sha256$200000$r0fHNWRbVQBAMGEAzZuT3w==$vuq++LZELR4JEEZM2IUYvES+mM8Ma8ajMVL9L6wqx/E=",
         "role": "admin",
         "full_name": "System Administrator",
         "permissions": ["view_analytics", "manage_users", "generate_reports"]
@@ -37,7 +55,6 @@ users_db = {
 
 class User(BaseModel):
     username: str
-    password: str
     role: str
     full_name: str
 
@@ -51,17 +68,61 @@ class LoginRequest(BaseModel):
     username: str
     password: str
 
+# --- Password Hashing ---
+def hash_password(password: str, iterations: int = PASSWORD_HASH_ITERATIONS) -> str:
+    salt = os.urandom(16)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations)
+    return f"pbkdf2_sha256${iterations}${base64.b64encode(salt).decode()}${base64.b64encode(digest).decode()}"
+
+def verify_password(password: str, password_hash: str) -> bool:
+    scheme, iterations, salt, expected = password_hash.split("$")
+    if scheme != "pbkdf2_sha256":
+        return False
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode(), base64.b64decode(salt), int(iterations))
+    return hmac.compare_digest(digest, base64.b64decode(expected))
+
+# Unknown usernames are checked against this so they take as long as wrong passwords
+_DUMMY_PASSWORD_HASH = hash_password("aerosentry-dummy-password")
+
 def authenticate_user(username: str, password: str) -> Optional[User]:
+    # Runs PBKDF2 (~0.1 s); call it off the event loop
     user = users_db.get(username)
-    if user and user["password"] == password:  # In production, use proper password hashing
+    password_ok = verify_password(password, user["password_hash"] if user else _DUMMY_PASSWORD_HASH)
+    if user and password_ok:
         return User(
             username=user["username"],
-            password=user["password"],
             role=user["role"],
             full_name=user["full_name"]
         )
     return None
 
+# --- Signing Keys ---
+def _load_private_key() -> Optional[bytes]:
+    if ALGORITHM not in ASYMMETRIC_ALGORITHMS:
+        return None
+    if not os.path.exists(JWT_PRIVATE_KEY_PATH):
+        print(f"⚠️ {JWT_PRIVATE_KEY_PATH} not found; this node verifies {ALGORITHM} tokens but cannot issue them.")
+        return None
+    with open(JWT_PRIVATE_KEY_PATH, "rb") as f:
+        return f.read()
+
+def load_jwks(path: str) -> Dict[str, tuple]:
+    """Public keys from a JWKS file as {kid: (algorithm, key)}; only EdDSA/RS256 keys are accepted."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        jwks = json.load(f)
+    keys = {}
+    for jwk in jwks.get("keys", []):
+        algorithm = jwk.get("alg") or {"OKP": "EdDSA", "RSA": "RS256"}.get(jwk.get("kty"))
+        if ASYMMETRIC_ALGORITHMS.get(algorithm) != jwk.get("kty") or "kid" not in jwk:
+            continue
+        keys[jwk["kid"]] = (algorithm, jwt.PyJWK(jwk, algorithm).key)
+    return keys
+
+PRIVATE_KEY = _load_private_key()
+PUBLIC_KEYS = load_jwks(JWKS_PATH)
+
 def create_access_token(data: dict, expires_delta: Optional[datetime.timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -69,13 +130,83 @@ def create_access_token(data: dict, expires_delta: Optional[datetime.timedelta]
     else:
         expire = datetime.datetime.utcnow() + datetime.timedelta(minutes=15)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    if ALGORITHM in ASYMMETRIC_ALGORITHMS:
+        if PRIVATE_KEY is None:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="This node does not issue tokens"
+            )
+        return jwt.encode(to_encode, PRIVATE_KEY, algorithm=ALGORITHM, headers={"kid": JWT_KEY_ID})
+    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm="HS256")
     return encoded_jwt
 
+# --- Verified Token Cache ---
+class VerifiedTokenCache:
+    """
+    Payloads of tokens that already passed signature and claim checks,
+    keyed by the token's SHA-256 digest. An entry is only served until
+    the token's own ``exp``; tokens without ``exp`` are never cached.
+    """
+
+    def __init__(self, max_entries: int = VERIFIED_TOKEN_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: Dict[bytes, tuple] = {}
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[Dict]:
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is None or entry[1] <= time.time():
+            if entry is not None:
+                del self._entries[key]
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        return entry[0]
+
+    def put(self, token: str, payload: Dict):
+        expires_at = payload.get("exp")
+        if not isinstance(expires_at, (int, float)):
+            return
+        if len(self._entries) >= self.max_entries:
+            now = time.time()
+            for key in [k for k, (_, exp) in self._entries.items() if exp <= now]:
+                del self._entries[key]
+            while len(self._entries) >= self.max_entries:
+                # Dicts keep insertion order: drop the oldest verification
+                del self._entries[next(iter(self._entries))]
+                self.stats["evictions"] += 1
+        self._entries[self._key(token)] = (payload, expires_at)
+
+    def snapshot_stats(self) -> dict:
+        return {**self.stats, "entries": len(self._entries)}
+
+TOKEN_CACHE = VerifiedTokenCache()
+
+def _decode_token(token: str) -> Dict:
+    header = jwt.get_unverified_header(token)
+    algorithm = header.get("alg")
+    if algorithm in ASYMMETRIC_ALGORITHMS:
+        algorithm, key = PUBLIC_KEYS.get(header.get("kid"), (None, None))
+        if key is None:
+            raise jwt.InvalidTokenError("Unknown signing key")
+        return jwt.decode(token, key, algorithms=[algorithm])
+    if ALGORITHM != "HS256":
+        # Nodes using asymmetric keys never accept shared-secret tokens
+        raise jwt.InvalidTokenError("HS256 tokens are not accepted")
+    return jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+
 def verify_token(token: str) -> Dict:
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    # Returned payloads may be shared with other requests; treat them as read-only
+    payload = TOKEN_CACHE.get(token)
+    if payload is not None:
         return payload
+    try:
+        payload = _decode_token(token)
     except jwt.ExpiredSignatureError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -86,7 +217,51 @@ def verify_token(token: str) -> Dict:
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid token"
         )
+    TOKEN_CACHE.put(token, payload)
+    return payload
 
 def get_user_role(token: str) -> str:
     payload = verify_token(token)
-    return payload.get("role", "pilot")
\ No newline at end of file
+    return payload.get("role", "pilot")
+
+# --- Key Generation CLI ---
+def generate_keys(algorithm: str, key_id: str, private_key_path: str, jwks_path: str):
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+
+    if algorithm == "EdDSA":
+        private_key = ed25519.Ed25519PrivateKey.generate()
+    else:
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    algorithm_class = jwt.algorithms.OKPAlgorithm if algorithm == "EdDSA" else jwt.algorithms.RSAAlgorithm
+    jwk = json.loads(algorithm_class.to_jwk(private_key.public_key()))
+    jwk.update({"kid": key_id, "alg": algorithm, "use": "sig"})
+
+    jwks = {"keys": []}
+    if os.path.exists(jwks_path):
+        with open(jwks_path, encoding="utf-8") as f:
+            jwks = json.load(f)
+    # Keep older keys so tokens they signed verify until they expire
+    jwks["keys"] = [k for k in jwks.get("keys", []) if k.get("kid") != key_id] + [jwk]
+    with open(private_key_path, "wb") as f:
+        f.write(pem)
+    os.chmod(private_key_path, 0o600)
+    with open(jwks_path, "w", encoding="utf-8") as f:
+        json.dump(jwks, f, indent=2)
+    print(f"✅ Wrote {algorithm} private key to {private_key_path} and public key '{key_id}' to {jwks_path}")
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="AeroSentry JWT signing keys")
+    sub = parser.add_subparsers(dest="command", required=True)
+    gen = sub.add_parser("generate-keys", help="Create a signing key and add its public key to the JWKS file")
+    gen.add_argument("--alg", choices=sorted(ASYMMETRIC_ALGORITHMS), default="EdDSA")
+    gen.add_argument("--kid", default=JWT_KEY_ID)
+    gen.add_argument("--private-key", default=JWT_PRIVATE_KEY_PATH)
+    gen.add_argument("--jwks", default=JWKS_PATH)
+    args = parser.parse_args()
+    generate_keys(args.alg, args.kid, args.private_key, args.jwks)
@@ -0,0 +1,107 @@
+# bench_load.py - End-to-end load test of /login, the briefing endpoints and /weather/region
+#
+# Usage (from admin-dashboard/backend):
+#   python benchmarks/bench_load.py --fixture convective --concurrency 1 8 32 --duration 10 --out load.json
+#   python benchmarks/bench_load.py --compare load.json   # exit 1 on regressions
+# Starts the fake upstream on the fixture day and a backend pointed at it
+# (see loadgen.py), then drives every scenario at every concurrency level
+# and reports RPS and latency percentiles as JSON.
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fixtures import ROUTES  # noqa: E402
+from loadgen import backend_stack, compare_results, drive, run_metadata  # noqa: E402
+
+SCENARIOS = ("login", "briefing", "briefing_text", "briefing_revalidate", "weather_region")
+
+
+def scenario_request(scenario: str, username: str, password: str):
+    def login(client, _):
+        return client.post("/login", json={"username": username, "password": password})
+
+    def briefing(client, sequence):
+        departure, destination = ROUTES[sequence % len(ROUTES)]
+        return client.get("/mission-briefing", params={"departure": departure, "destination": destination})
+
+    def briefing_text(client, sequence):
+        departure, destination = ROUTES[sequence % len(ROUTES)]
+        return client.get("/mission-briefing/text", params={"departure": departure, "destination": destination})
+
+    etags = {}
+
+    async def briefing_revalidate(client, sequence):
+        # A polling client: sends back the ETag it last saw, so unchanged briefings cost a 304
+        route = ROUTES[sequence % len(ROUTES)]
+        headers = {"If-None-Match": etags[route]} if route in etags else None
+        response = await client.get("/mission-briefing", params={"departure": route[0], "destination": route[1]}, headers=headers)
+        if "etag" in response.headers:
+            etags[route] = response.headers["etag"]
+        return response
+
+    def weather_region(client, sequence):
+        # A map panning east across the Indian network, mostly over already-built tiles
+        lon_min = 66.0 + (sequence % 8) * 2.5
+        return client.get("/weather/region", params={"lat_min": 6, "lat_max": 32, "lon_min": lon_min, "lon_max": lon_min + 20, "zoom": 5})
+
+    return {"login": login, "briefing": briefing, "briefing_text": briefing_text,
+            "briefing_revalidate": briefing_revalidate, "weather_region": weather_region}[scenario]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end load test of the briefing API")
+    parser.add_argument("--fixture", default="quiet", help="Built-in day (quiet, convective) or a recorded JSON file")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--workers", type=int, default=1, help="Pre-fork workers; 0 runs single-process uvicorn")
+    parser.add_argument("--upstream-latency-ms", type=float, default=0.0)
+    parser.add_argument("--username", default="pilot1")
+    parser.add_argument("--password", default="pilot123")
+    parser.add_argument("--out", help="Also write the results to this file")
+    parser.add_argument("--compare", help="Earlier result file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed RPS drop before flagging, as a fraction")
+    args = parser.parse_args()
+
+    results = []
+    with backend_stack(args.workers, args.fixture, args.upstream_latency_ms) as base_url:
+        token = httpx.post(base_url + "/login", json={"username": args.username, "password": args.password}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        for scenario in args.scenarios:
+            request = scenario_request(scenario, args.username, args.password)
+            for concurrency in args.concurrency:
+                if args.warmup:
+                    asyncio.run(drive(base_url, request, concurrency, args.warmup, headers))
+                result = asyncio.run(drive(base_url, request, concurrency, args.duration, headers))
+                results.append({"scenario": scenario, "concurrency": concurrency, **result})
+                print(f"{scenario} x{concurrency}: {result['rps']} rps, p95 {result['latency_ms']['p95']} ms", file=sys.stderr)
+
+    report = {
+        "meta": run_metadata(suite="load", fixture=args.fixture, workers=args.workers, duration=args.duration,
+                             upstream_latency_ms=args.upstream_latency_ms),
+        "results": results,
+    }
+    regressions = False
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        report["comparison"] = compare_results(results, baseline["results"], ("scenario", "concurrency"), "rps",
+                                               higher_is_better=True, tolerance=args.tolerance)
+        regressions = any(row["regression"] for row in report["comparison"])
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
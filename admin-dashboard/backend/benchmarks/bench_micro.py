@@ -0,0 +1,140 @@
+# bench_micro.py - Microbenchmarks for the briefing pipeline stages
+#
+# Usage (from admin-dashboard/backend):
+#   python benchmarks/bench_micro.py --fixture convective --out micro.json
+#   python benchmarks/bench_micro.py --compare micro.json   # exit 1 on regressions
+# Times parsing, checkpoint generation, SIGMET snapshot building, route/
+# hazard intersection (spatial only and ETA-aware) and rerouting in-process on a fixture day (see
+# fixtures.py). Every row reports the median time per operation.
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import parsing  # noqa: E402
+from fixtures import AIRPORTS, ROUTES, load_fixture  # noqa: E402
+from loadgen import compare_results, run_metadata  # noqa: E402
+from reroute import ObstacleField, haversine_km, plan_reroute  # noqa: E402
+from route_cache import batch_checkpoints  # noqa: E402
+from sigmet_store import build_snapshot, feed_version  # noqa: E402
+
+CHECKPOINT_INTERVAL_KM = 400
+CRUISE_SPEED_KMH = 450 * 1.852
+
+
+def measure(fn: Callable[[], object], min_batch_seconds: float, repeat: int) -> dict:
+    """Median seconds per call, with calls batched so each sample lasts at least ``min_batch_seconds``."""
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        if time.perf_counter() - started >= min_batch_seconds or loops >= 1 << 20:
+            break
+        loops *= 2
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        samples.append((time.perf_counter() - started) / loops)
+    return {"loops": loops, "median_us": round(statistics.median(samples) * 1e6, 2),
+            "min_us": round(min(samples) * 1e6, 2)}
+
+
+def as_points(route) -> List[Dict[str, float]]:
+    return [{"lat": lat, "lon": lon} for lat, lon in route.tolist()]
+
+
+def route_etas(points: List[Dict[str, float]], departure_ts: float) -> np.ndarray:
+    lon, lat = np.array([p["lon"] for p in points]), np.array([p["lat"] for p in points])
+    leg_km = haversine_km(lon[:-1], lat[:-1], lon[1:], lat[1:])
+    return departure_ts + np.concatenate([[0.0], np.cumsum(leg_km)]) / CRUISE_SPEED_KMH * 3600
+
+
+def run(fixture_name: str, min_batch_seconds: float, repeat: int) -> List[dict]:
+    fixture = load_fixture(fixture_name)
+    coords = {ident: (lat, lon) for ident, _, lat, lon in AIRPORTS}
+    pairs = [(*coords[dep], *coords[dest]) for dep, dest in ROUTES]
+    routes = [as_points(r) for r in batch_checkpoints(pairs, CHECKPOINT_INTERVAL_KM)]
+    snapshot = build_snapshot(fixture["sigmet"], feed_version(fixture["sigmet"]))
+    field = ObstacleField(snapshot.hazards)
+    etas = [route_etas(points, time.time()) for points in routes]
+    blocked_routes = [points for points in routes if snapshot.route_hits(points)]
+    raw_metars = [item["rawOb"] for item in fixture["metar"]]
+    raw_tafs = [item["rawTAF"] for item in fixture["taf"]]
+    parsing.parse_feed("metar", fixture["metar"])
+    parsing.parse_feed("taf", fixture["taf"])
+
+    cases = {
+        # per report, uncached vs memoized
+        "parse_metar_uncached": (lambda: [parsing._parse_metar(raw) for raw in raw_metars], len(raw_metars)),
+        "parse_taf_uncached": (lambda: [parsing._parse_taf(raw) for raw in raw_tafs], len(raw_tafs)),
+        "parse_feed_memoized": (lambda: (parsing.parse_feed("metar", fixture["metar"]),
+                                         parsing.parse_feed("taf", fixture["taf"])), len(raw_metars) + len(raw_tafs)),
+        # per route
+        "checkpoints_single": (lambda: [batch_checkpoints([pair], CHECKPOINT_INTERVAL_KM) for pair in pairs], len(pairs)),
+        "checkpoints_batched": (lambda: batch_checkpoints(pairs, CHECKPOINT_INTERVAL_KM), len(pairs)),
+        "hazard_intersection": (lambda: [snapshot.route_hits(points) for points in routes], len(routes)),
+        "hazard_intersection_4d": (lambda: [snapshot.route_hits(points, route_eta) for points, route_eta in zip(routes, etas)],
+                                   len(routes)),
+        # per snapshot
+        "sigmet_snapshot_build": (lambda: build_snapshot(fixture["sigmet"], "bench"), 1),
+        "obstacle_field_build": (lambda: ObstacleField(snapshot.hazards), 1),
+    }
+    if blocked_routes:
+        cases["reroute"] = (lambda: [plan_reroute(points, field) for points in blocked_routes], len(blocked_routes))
+
+    results = []
+    for name, (fn, ops) in cases.items():
+        timing = measure(fn, min_batch_seconds, repeat)
+        results.append({
+            "benchmark": name,
+            "ops_per_call": ops,
+            "median_us_per_op": round(timing["median_us"] / ops, 3),
+            "min_us_per_op": round(timing["min_us"] / ops, 3),
+            "loops": timing["loops"],
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks for the briefing pipeline")
+    parser.add_argument("--fixture", default="convective", help="Built-in day (quiet, convective) or a recorded JSON file")
+    parser.add_argument("--min-batch-seconds", type=float, default=0.2)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--out", help="Also write the results to this file")
+    parser.add_argument("--compare", help="Earlier result file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed slowdown before flagging, as a fraction")
+    args = parser.parse_args()
+
+    # The pipeline logs to stdout; keep stdout for the JSON report
+    with contextlib.redirect_stdout(sys.stderr):
+        results = run(args.fixture, args.min_batch_seconds, args.repeat)
+    report = {"meta": run_metadata(suite="micro", fixture=args.fixture), "results": results}
+    regressions = False
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        report["comparison"] = compare_results(report["results"], baseline["results"], ("benchmark",),
+                                               "median_us_per_op", higher_is_better=False, tolerance=args.tolerance)
+        regressions = any(row["regression"] for row in report["comparison"])
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# bench_parsing.py - Per-call vs memoized vs bulk vs process-pool METAR/TAF parsing
+#
+# Usage (from admin-dashboard/backend):
+#   python benchmarks/bench_parsing.py --stations 2000 --repeat 5
+# Prints one JSON object with reports/second for every strategy.
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import parsing  # noqa: E402
+
+WEATHER = ["", "-RA", "TSRA", "BR", "HZ", "+SHRA", "FG"]
+CLOUDS = ["FEW250", "SCT040", "BKN020", "OVC008", "BKN012CB", "NSC"]
+
+
+def synthetic_feed(stations: int, seed: int = 7):
+    rng = random.Random(seed)
+    metars, tafs = [], []
+    for i in range(stations):
+        icao = "K" + "".join(chr(65 + (i // 26 ** d) % 26) for d in (2, 1, 0))
+        wind = f"{rng.randrange(0, 360, 10):03d}{rng.randint(0, 35):02d}KT"
+        vis = rng.choice(["10SM", "6SM", "3SM", "1SM", "1/2SM"])
+        wx = rng.choice(WEATHER)
+        metars.append({"icaoId": icao, "rawOb": f"{icao} 161151Z {wind} {vis} {wx} {rng.choice(CLOUDS)} 2{i % 10}/1{i % 10} A30{i % 90:02d}".replace("  ", " ")})
+        tafs.append({"icaoId": icao, "rawTAF": (
+            f"TAF {icao} 161130Z 1612/1718 {wind} P6SM {rng.choice(CLOUDS)} "
+            f"FM161800 {rng.randrange(0, 360, 10):03d}12G22KT 5SM {rng.choice(WEATHER) or '-RA'} BKN030 "
+            f"TEMPO 1620/1624 2SM TSRA BKN015CB PROB30 TEMPO 1702/1706 1SM BR BECMG 1708/1710 VRB03KT 9999"
+        )})
+    return metars, tafs
+
+
+def timed(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def run(stations: int, repeat: int) -> dict:
+    metars, tafs = synthetic_feed(stations)
+    reports = len(metars) + len(tafs)
+
+    def per_call_uncached():
+        for item in metars:
+            parsing._parse_metar(item["rawOb"])
+        for item in tafs:
+            parsing._parse_taf(item["rawTAF"])
+
+    def per_call_memoized():
+        for item in metars:
+            parsing.parse_metar_to_json(item["rawOb"])
+        for item in tafs:
+            parsing.parse_taf_to_json(item["rawTAF"])
+
+    def bulk():
+        parsing.parse_feed("metar", metars)
+        parsing.parse_feed("taf", tafs)
+
+    def cold(fn):
+        def wrapped():
+            parsing.PARSE_CACHE = parsing.ParseCache()
+            fn()
+        return wrapped
+
+    async def pooled():
+        await asyncio.gather(parsing.parse_feed_async("metar", metars), parsing.parse_feed_async("taf", tafs))
+
+    results = {"per_call_uncached": timed(per_call_uncached, repeat)}
+    results["bulk_cold"] = timed(cold(bulk), repeat)
+    parsing.PARSE_CACHE = parsing.ParseCache()
+    bulk()
+    results["per_call_memoized_warm"] = timed(per_call_memoized, repeat)
+    results["bulk_warm"] = timed(bulk, repeat)
+
+    # Start the workers outside the timed region; spawn start-up is a one-off cost
+    parsing.PROCESS_POOL_THRESHOLD = 0
+    parsing._pool().submit(int).result()
+    results["process_pool_cold"] = timed(cold(lambda: asyncio.run(pooled())), repeat)
+    parsing.shutdown_parse_pool()
+
+    return {
+        "stations": stations,
+        "reports": reports,
+        "pool_workers": parsing.PARSE_POOL_WORKERS,
+        "seconds": {name: round(seconds, 6) for name, seconds in results.items()},
+        "reports_per_second": {name: round(reports / seconds) for name, seconds in results.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark METAR/TAF parsing strategies")
+    parser.add_argument("--stations", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=parsing.PARSE_POOL_WORKERS)
+    args = parser.parse_args()
+    parsing.PARSE_POOL_WORKERS = args.workers
+    parsing.PARSE_CACHE = parsing.ParseCache(max_entries=4 * args.stations)
+    print(json.dumps(run(args.stations, args.repeat), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# bench_server.py - Throughput of the single-process launcher vs the pre-fork server
+#
+# Usage (from admin-dashboard/backend):
+#   python benchmarks/bench_server.py --workers 1 2 4 --duration 15 --concurrency 64
+# Starts each server variant against the fake upstream (see loadgen.py),
+# drives it with concurrent keep-alive clients and prints one JSON object
+# with RPS and latency percentiles per variant. The default path needs no
+# weather data, so it measures serving overhead rather than briefing work.
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from loadgen import backend_stack, drive  # noqa: E402
+
+DEFAULT_PATH = "/airports/nearest?lat=28.5&lon=77.1&k=5"
+
+
+def bench_variant(workers: int, args) -> dict:
+    with backend_stack(workers) as base_url:
+        token = httpx.post(base_url + "/login", json={"username": args.username, "password": args.password}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        def request(client, _):
+            return client.get(args.path)
+
+        # Warm-up pass so every worker has its caches populated
+        asyncio.run(drive(base_url, request, args.concurrency, min(2.0, args.duration), headers))
+        result = asyncio.run(drive(base_url, request, args.concurrency, args.duration, headers))
+    return {"variant": "single" if workers == 0 else "prefork", "workers": max(workers, 1), **result}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark server throughput across worker counts")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--path", default=DEFAULT_PATH)
+    parser.add_argument("--username", default="pilot1")
+    parser.add_argument("--password", default="pilot123")
+    args = parser.parse_args()
+
+    results = [bench_variant(workers, args) for workers in [0] + args.workers]
+    baseline = results[0]["rps"] or 1.0
+    for result in results:
+        result["speedup"] = round(result["rps"] / baseline, 2)
+    print(json.dumps({"path": args.path, "concurrency": args.concurrency, "cpu_count": os.cpu_count(),
+                      "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# fake_upstream.py - Local stand-in for the aviationweather.gov data API
+#
+# Serves /metar, /taf and /sigmet from a fixture (see fixtures.py):
+#   python benchmarks/fake_upstream.py --fixture convective --port 8799 --latency-ms 40
+# then start the backend with AVIATIONWEATHER_BASE_URL=http://127.0.0.1:8799/
+import argparse
+import asyncio
+import os
+import sys
+
+import uvicorn
+from fastapi import FastAPI
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fixtures import load_fixture  # noqa: E402
+
+
+def create_app(fixture: dict, latency_ms: float = 0.0) -> FastAPI:
+    app = FastAPI()
+    metars = {item["icaoId"]: item for item in fixture.get("metar", [])}
+    tafs = {item["icaoId"]: item for item in fixture.get("taf", [])}
+    sigmets = fixture.get("sigmet", [])
+    stats = {"metar": 0, "taf": 0, "sigmet": 0}
+
+    async def simulate_latency():
+        if latency_ms:
+            await asyncio.sleep(latency_ms / 1000)
+
+    @app.get("/metar")
+    async def metar(ids: str = "", format: str = "json"):
+        stats["metar"] += 1
+        await simulate_latency()
+        return [metars[code] for code in ids.upper().split(",") if code in metars]
+
+    @app.get("/taf")
+    async def taf(ids: str = "", format: str = "json"):
+        stats["taf"] += 1
+        await simulate_latency()
+        return [tafs[code] for code in ids.upper().split(",") if code in tafs]
+
+    @app.get("/sigmet")
+    async def sigmet(format: str = "json"):
+        stats["sigmet"] += 1
+        await simulate_latency()
+        return sigmets
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve METAR/TAF/SIGMET fixtures like aviationweather.gov")
+    parser.add_argument("--fixture", default="quiet", help="Built-in day (quiet, convective) or a recorded JSON file")
+    parser.add_argument("--seed", type=int, default=2024)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Added delay per response")
+    args = parser.parse_args()
+    app = create_app(load_fixture(args.fixture, args.seed), args.latency_ms)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning", access_log=False)
+
+
+if __name__ == "__main__":
+    main()
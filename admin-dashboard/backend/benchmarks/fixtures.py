@@ -0,0 +1,179 @@
+# fixtures.py - METAR/TAF/SIGMET fixtures for the benchmark suite
+#
+# A fixture is a JSON object {"metar": [...], "taf": [...], "sigmet": [...]}
+# in the aviationweather.gov response format. Built-in days are generated
+# deterministically from a seed so runs are comparable between commits:
+#   quiet       - scattered weather, a couple of small thunderstorm SIGMETs
+#   convective  - a heavy convective day: dozens of TS SIGMETs across the
+#                 Indian and US route networks, plus TURB/ICE areas
+# Record a real day from the live API with:
+#   python benchmarks/fixtures.py record --out fixtures/2024-06-14.json
+import argparse
+import csv
+import json
+import math
+import os
+import random
+import time
+from typing import Dict, List, Tuple
+
+import httpx
+
+BUILTIN_DAYS = ("quiet", "convective")
+LIVE_BASE_URL = "https://aviationweather.gov/api/data/"
+
+# (ident, name, lat, lon)
+AIRPORTS: List[Tuple[str, str, float, float]] = [
+    ("VIDP", "Indira Gandhi", 28.5665, 77.1031), ("VABB", "Chhatrapati Shivaji", 19.0887, 72.8679),
+    ("VOBL", "Kempegowda", 13.1979, 77.7063), ("VOMM", "Chennai", 12.9900, 80.1693),
+    ("VECC", "Netaji Subhas Chandra Bose", 22.6547, 88.4467), ("VOHS", "Rajiv Gandhi", 17.2313, 78.4298),
+    ("VAAH", "Sardar Vallabhbhai Patel", 23.0772, 72.6347), ("VOCI", "Cochin", 10.1520, 76.4019),
+    ("VAPO", "Pune", 18.5821, 73.9197), ("VEGT", "Lokpriya Gopinath Bordoloi", 26.1061, 91.5859),
+    ("VILK", "Chaudhary Charan Singh", 26.7606, 80.8893), ("VIJP", "Jaipur", 26.8242, 75.8122),
+    ("VANP", "Dr. Babasaheb Ambedkar", 21.0922, 79.0472), ("VOTV", "Trivandrum", 8.4821, 76.9201),
+    ("VEPT", "Jay Prakash Narayan", 25.5913, 85.0880), ("VEBS", "Biju Patnaik", 20.2444, 85.8178),
+    ("KJFK", "John F Kennedy", 40.6398, -73.7789), ("KLAX", "Los Angeles", 33.9425, -118.4081),
+    ("KORD", "Chicago O'Hare", 41.9786, -87.9048), ("KATL", "Hartsfield-Jackson", 33.6367, -84.4281),
+    ("KDFW", "Dallas/Fort Worth", 32.8968, -97.0380), ("KDEN", "Denver", 39.8617, -104.6731),
+    ("KSFO", "San Francisco", 37.6190, -122.3749), ("KSEA", "Seattle-Tacoma", 47.4490, -122.3093),
+    ("KMIA", "Miami", 25.7932, -80.2906), ("KBOS", "Logan", 42.3643, -71.0052),
+    ("KIAH", "George Bush Intercontinental", 29.9844, -95.3414), ("KMSP", "Minneapolis-St Paul", 44.8820, -93.2218),
+    ("KPHX", "Phoenix Sky Harbor", 33.4343, -112.0116), ("KDTW", "Detroit Metro", 42.2124, -83.3534),
+    ("KCLT", "Charlotte Douglas", 35.2140, -80.9431), ("KMCO", "Orlando", 28.4294, -81.3090),
+    ("EGLL", "Heathrow", 51.4706, -0.4619), ("LFPG", "Charles de Gaulle", 49.0128, 2.5500),
+    ("EDDF", "Frankfurt", 50.0264, 8.5431), ("EHAM", "Schiphol", 52.3086, 4.7639),
+    ("OMDB", "Dubai", 25.2528, 55.3644), ("WSSS", "Changi", 1.3502, 103.9940),
+    ("VHHH", "Hong Kong", 22.3089, 113.9150), ("RJTT", "Haneda", 35.5523, 139.7800),
+]
+
+# City pairs the load driver and microbenchmarks brief
+ROUTES: List[Tuple[str, str]] = [
+    ("VOBL", "VIDP"), ("VABB", "VECC"), ("VOMM", "VIDP"), ("VAAH", "VEGT"), ("VOCI", "VILK"),
+    ("VOTV", "VIJP"), ("VOHS", "VEPT"), ("VAPO", "VEBS"), ("KJFK", "KLAX"), ("KORD", "KMIA"),
+    ("KATL", "KSEA"), ("KDFW", "KBOS"), ("KDEN", "KMCO"), ("KIAH", "KMSP"), ("KSFO", "KCLT"),
+    ("KPHX", "KDTW"), ("EGLL", "OMDB"), ("VIDP", "WSSS"), ("VHHH", "RJTT"), ("EHAM", "KJFK"),
+]
+
+# Convective belts (lat_min, lat_max, lon_min, lon_max) the heavy day fills with cells
+CONVECTIVE_REGIONS = [(10.0, 27.0, 73.0, 89.0), (28.0, 45.0, -100.0, -78.0)]
+
+
+def write_airports_csv(path: str):
+    """Writes the fixture airports in the OurAirports CSV layout read by airport_index.py."""
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "ident", "type", "name", "latitude_deg", "longitude_deg"])
+        for i, (ident, name, lat, lon) in enumerate(AIRPORTS, start=1):
+            writer.writerow([i, ident, "large_airport", name, lat, lon])
+
+
+def _metar(rng: random.Random, ident: str, day: str, now: time.struct_time) -> str:
+    stamp = time.strftime("%d%H00Z", now)
+    wind = f"{rng.randrange(10, 370, 10) % 360:03d}{rng.randint(3, 28):02d}KT"
+    if day == "convective" and rng.random() < 0.4:
+        return f"{ident} {stamp} {wind} 3000 TSRA BKN012CB OVC030 24/22 Q1004"
+    sky, vis, wx = rng.choice([("FEW250", "9999", ""), ("SCT030", "9999", ""), ("BKN015", "6000", "-RA "),
+                               ("OVC008", "2500", "BR "), ("BKN040", "8000", "HZ ")])
+    return f"{ident} {stamp} {wind} {vis} {wx}{sky} 27/19 Q1011"
+
+
+def _taf(rng: random.Random, ident: str, day: str, now: time.struct_time) -> str:
+    dd, hh = now.tm_mday, now.tm_hour
+    end_day = (dd % 28) + 1
+    tempo = "TEMPO {0:02d}{1:02d}/{0:02d}{2:02d} 3000 TSRA BKN010CB".format(dd, min(hh + 1, 23), min(hh + 5, 24))
+    change = tempo if day == "convective" or rng.random() < 0.3 else f"BECMG {dd:02d}{min(hh + 1, 23):02d}/{dd:02d}{min(hh + 3, 24):02d} 9999 NSW"
+    return (f"TAF {ident} {dd:02d}{hh:02d}00Z {dd:02d}{hh:02d}/{end_day:02d}{hh:02d} "
+            f"{rng.randrange(10, 370, 10) % 360:03d}{rng.randint(3, 20):02d}KT 9999 SCT025 {change} "
+            f"FM{end_day:02d}0000 {rng.randrange(10, 370, 10) % 360:03d}08KT 9999 FEW030")
+
+
+def _cell(rng: random.Random, lat: float, lon: float, radius_deg: float) -> List[Dict[str, float]]:
+    # Irregular convex-ish polygon around (lat, lon), closed like the upstream feed
+    count = rng.randint(6, 10)
+    points = []
+    for k in range(count):
+        angle = 2 * math.pi * k / count
+        r = radius_deg * rng.uniform(0.7, 1.2)
+        points.append({"lat": round(lat + r * math.sin(angle), 3), "lon": round(lon + r * math.cos(angle), 3)})
+    return points + [points[0]]
+
+
+def _sigmets(rng: random.Random, day: str) -> List[dict]:
+    now = int(time.time())
+    counts = {"quiet": {"TS": 2}, "convective": {"TS": 60, "TURB": 8, "ICE": 6}}[day]
+    sigmets = []
+    for hazard, count in counts.items():
+        for i in range(count):
+            lat_min, lat_max, lon_min, lon_max = rng.choice(CONVECTIVE_REGIONS)
+            lat, lon = rng.uniform(lat_min, lat_max), rng.uniform(lon_min, lon_max)
+            radius = rng.uniform(0.4, 1.6) if hazard == "TS" else rng.uniform(1.5, 3.0)
+            start = now - rng.randint(0, 3600)
+            sigmets.append({
+                "hazard": hazard,
+                "rawSigmet": f"FIXTURE SIGMET {hazard} {i + 1} VALID {time.strftime('%d%H%M', time.gmtime(start))}",
+                "validTimeFrom": start,
+                "validTimeTo": start + rng.choice([2, 4, 6]) * 3600,
+                "points": _cell(rng, lat, lon, radius),
+            })
+    return sigmets
+
+
+def build_fixture(day: str, seed: int = 2024) -> dict:
+    if day not in BUILTIN_DAYS:
+        raise ValueError(f"Unknown fixture day {day!r}; expected one of {BUILTIN_DAYS} or a JSON file")
+    rng = random.Random(f"{day}-{seed}")
+    now = time.gmtime()
+    return {
+        "metar": [{"icaoId": a[0], "rawOb": _metar(rng, a[0], day, now), "obsTime": int(time.time()) - 600} for a in AIRPORTS],
+        "taf": [{"icaoId": a[0], "rawTAF": _taf(rng, a[0], day, now)} for a in AIRPORTS],
+        "sigmet": _sigmets(rng, day),
+    }
+
+
+def load_fixture(name_or_path: str, seed: int = 2024) -> dict:
+    """A built-in day by name, or a recorded fixture file."""
+    if os.path.exists(name_or_path):
+        with open(name_or_path, encoding="utf-8") as f:
+            return json.load(f)
+    return build_fixture(name_or_path, seed)
+
+
+def record_fixture(out_path: str, stations: List[str], base_url: str = LIVE_BASE_URL):
+    """Captures the live METAR/TAF/SIGMET feeds for ``stations`` into a fixture file."""
+    headers = {"User-Agent": "AeroSentry-bench/1.0"}
+    with httpx.Client(base_url=base_url, headers=headers, timeout=30) as client:
+        ids = ",".join(stations)
+        fixture = {
+            "metar": client.get("metar", params={"ids": ids, "format": "json"}).json(),
+            "taf": client.get("taf", params={"ids": ids, "format": "json"}).json(),
+            "sigmet": client.get("sigmet", params={"format": "json"}).json(),
+        }
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(fixture, f)
+    print(f"✅ Recorded {len(fixture['metar'])} METARs, {len(fixture['taf'])} TAFs and "
+          f"{len(fixture['sigmet'])} SIGMETs to {out_path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AeroSentry benchmark fixtures")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rec = sub.add_parser("record", help="Record the live aviationweather.gov feeds")
+    rec.add_argument("--out", required=True)
+    rec.add_argument("--stations", default=",".join(a[0] for a in AIRPORTS))
+    rec.add_argument("--base-url", default=LIVE_BASE_URL)
+    dump = sub.add_parser("dump", help="Write a built-in day to a file")
+    dump.add_argument("day", choices=BUILTIN_DAYS)
+    dump.add_argument("--out", required=True)
+    dump.add_argument("--seed", type=int, default=2024)
+    args = parser.parse_args()
+
+    if args.command == "record":
+        record_fixture(args.out, args.stations.split(","), args.base_url)
+    else:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(build_fixture(args.day, args.seed), f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
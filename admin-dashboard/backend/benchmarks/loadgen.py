@@ -0,0 +1,182 @@
+# loadgen.py - Closed-loop HTTP load driver shared by the server benchmarks
+import asyncio
+import os
+import platform
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from fixtures import write_airports_csv  # noqa: E402
+
+# Issues one request with the shared client and returns its response
+RequestFn = Callable[[httpx.AsyncClient, int], Awaitable[httpx.Response]]
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+async def drive(base_url: str, request: RequestFn, concurrency: int, duration: float, headers: dict = None) -> dict:
+    """
+    ``concurrency`` virtual users each send requests back to back for
+    ``duration`` seconds over keep-alive connections. Responses other than
+    2xx and 304, and transport errors, count as errors and are left out of
+    the latencies.
+    """
+    latencies, errors = [], 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, headers=headers or {}, limits=limits, timeout=60) as client:
+        stop_at = time.perf_counter() + duration
+        sequence = 0
+
+        async def user():
+            nonlocal errors, sequence
+            while time.perf_counter() < stop_at:
+                sequence += 1
+                started = time.perf_counter()
+                try:
+                    response = await request(client, sequence)
+                except httpx.HTTPError:
+                    errors += 1
+                    continue
+                if not response.is_success and response.status_code != 304:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "latency_ms": {
+            **{f"p{int(q * 100)}": round(percentile(latencies, q) * 1000, 2) for q in (0.5, 0.95, 0.99)},
+            "max": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        },
+    }
+
+
+def wait_ready(base_url: str, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(base_url + "/ready", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{base_url} did not become ready in {timeout}s")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_backend(port: int, workers: int, workdir: str, env: Optional[Dict[str, str]] = None) -> subprocess.Popen:
+    """
+    ``workers`` 0 starts plain single-process uvicorn (the old launcher,
+    minus its reload watcher); otherwise the pre-fork run_backend.py.
+    ``workdir`` holds airports.csv and the analytics database.
+    """
+    if workers == 0:
+        cmd = [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning", "--no-access-log"]
+    else:
+        cmd = [sys.executable, os.path.join(BACKEND_DIR, "run_backend.py"), "--port", str(port),
+               "--workers", str(workers), "--log-level", "warning"]
+    process_env = {**os.environ, "PYTHONPATH": BACKEND_DIR, **(env or {})}
+    return subprocess.Popen(cmd, cwd=workdir, env=process_env, stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+
+
+def stop_process(process: subprocess.Popen, timeout: float = 60.0):
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+@contextmanager
+def backend_stack(workers: int, fixture: str = "quiet", upstream_latency_ms: float = 0.0):
+    """
+    Runs the fake upstream serving ``fixture`` and a backend pointed at it,
+    in a scratch directory with the fixture airports. Yields the backend URL
+    once /ready passes.
+    """
+    with tempfile.TemporaryDirectory(prefix="aerosentry-bench-") as workdir:
+        write_airports_csv(os.path.join(workdir, "airports.csv"))
+        upstream_port, backend_port = free_port(), free_port()
+        upstream = subprocess.Popen(
+            [sys.executable, os.path.join(BENCH_DIR, "fake_upstream.py"), "--fixture", fixture,
+             "--port", str(upstream_port), "--latency-ms", str(upstream_latency_ms)],
+            stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT
+        )
+        backend = None
+        try:
+            backend = start_backend(backend_port, workers, workdir, {
+                "AVIATIONWEATHER_BASE_URL": f"http://127.0.0.1:{upstream_port}/",
+                "ANALYTICS_DB_PATH": os.path.join(workdir, "analytics.db"),
+            })
+            base_url = f"http://127.0.0.1:{backend_port}"
+            wait_ready(base_url)
+            yield base_url
+        finally:
+            if backend is not None:
+                stop_process(backend)
+            stop_process(upstream)
+
+
+def run_metadata(**extra) -> dict:
+    """Identifies a result file so runs can be compared between commits."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True,
+                                text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        **extra,
+    }
+
+
+def compare_results(current: List[dict], baseline: List[dict], key_fields: Tuple[str, ...], metric: str,
+                    higher_is_better: bool, tolerance: float) -> List[dict]:
+    """
+    Pairs up rows with the same ``key_fields`` and reports the relative
+    change of ``metric``; rows worse by more than ``tolerance`` (a fraction)
+    are flagged as regressions.
+    """
+    previous = {tuple(row.get(k) for k in key_fields): row for row in baseline}
+    changes = []
+    for row in current:
+        key = tuple(row.get(k) for k in key_fields)
+        old = previous.get(key)
+        if old is None or not old.get(metric):
+            continue
+        change = (row[metric] - old[metric]) / old[metric]
+        worse = -change if higher_is_better else change
+        changes.append({**dict(zip(key_fields, key)), "baseline": old[metric], "current": row[metric],
+                        "change_pct": round(change * 100, 1), "regression": worse > tolerance})
+    return changes
@@ -0,0 +1,126 @@
+# briefing_cache.py - Encoded mission briefings keyed by the inputs they were built from
+#
+# A briefing is a function of the two stations' raw METAR/TAF text, the
+# SIGMETs valid during the flight (main.flight_hazards) and the flight plan,
+# so a hash of those inputs is its version; its sigmet_snapshot_version
+# names the snapshot it was first computed from. The version doubles as the ETag: any worker can answer a
+# matching If-None-Match with 304 before doing any work, and the JSON body
+# and text report are each encoded once per version and shared by
+# /mission-briefing and /mission-briefing/text.
+import asyncio
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+
+BRIEFING_CACHE_SIZE = 2048
+
+BriefingKey = Tuple[str, str, str]
+
+
+def briefing_version(*inputs) -> str:
+    canonical = json.dumps(inputs, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()[:20]
+
+
+def etag_matches(if_none_match: Optional[str], etag: Optional[str]) -> bool:
+    """RFC 9110 weak comparison of an If-None-Match header against ``etag``."""
+    if not if_none_match or not etag:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in (tag[2:] if tag.startswith("W/") else tag for tag in candidates)
+
+
+def encode_json(content) -> bytes:
+    # Same encoding as FastAPI's default JSONResponse
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False,
+                      separators=(",", ":")).encode("utf-8")
+
+
+class CachedBriefing:
+    """
+    One briefing and its lazily encoded response bodies. ``briefing`` is None
+    when the client already holds this version (answer 304); ``version`` is
+    None for error results, which are neither cached nor tagged.
+    """
+    __slots__ = ("version", "briefing", "_json_body", "_text_body")
+
+    def __init__(self, version: Optional[str], briefing: Optional[dict]):
+        self.version = version
+        self.briefing = briefing
+        self._json_body: Optional[bytes] = None
+        self._text_body: Optional[bytes] = None
+
+    @property
+    def etag(self) -> Optional[str]:
+        return None if self.version is None else f'"{self.version}"'
+
+    @property
+    def not_modified(self) -> bool:
+        return self.briefing is None
+
+    def json_body(self) -> bytes:
+        if self._json_body is None:
+            self._json_body = encode_json(self.briefing)
+        return self._json_body
+
+    def text_body(self, render: Callable[[dict], str]) -> bytes:
+        if self._text_body is None:
+            self._text_body = encode_json({"briefing_text": render(self.briefing)})
+        return self._text_body
+
+
+class BriefingCache:
+    """
+    LRU of CachedBriefing keyed by (departure, destination, version).
+    Concurrent misses for the same key are coalesced like in WeatherCache:
+    the first runs ``compute`` as a task owned by the cache, and every
+    caller awaits it through a shield, so a cancelled request (a client
+    disconnect) neither cancels it nor fails the others waiting on it.
+    """
+
+    def __init__(self, max_entries: int = BRIEFING_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[BriefingKey, CachedBriefing]" = OrderedDict()
+        self._inflight: Dict[BriefingKey, asyncio.Task] = {}
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0, "not_modified": 0}
+
+    async def get_or_compute(self, key: BriefingKey, compute: Callable[[], Awaitable[dict]]) -> CachedBriefing:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.stats["hits"] += 1
+            self._entries.move_to_end(key)
+            return entry
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+        else:
+            self.stats["misses"] += 1
+            task = self._inflight[key] = asyncio.ensure_future(self._compute(key, compute))
+        return await asyncio.shield(task)
+
+    async def _compute(self, key: BriefingKey, compute: Callable[[], Awaitable[dict]]) -> CachedBriefing:
+        try:
+            entry = CachedBriefing(key[2], await compute())
+            self._store(key, entry)
+            return entry
+        finally:
+            self._inflight.pop(key, None)
+
+    def _store(self, key: BriefingKey, entry: CachedBriefing):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def snapshot_stats(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["misses"] + self.stats["coalesced"]
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "hit_ratio": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+        }
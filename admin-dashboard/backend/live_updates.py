@@ -0,0 +1,205 @@
+# live_updates.py - Server-Sent Events channel pushing briefing changes per city pair
+#
+# All subscribers of one departure/destination pair share a channel. A
+# single background loop re-reads the (cached) METAR/TAF feeds of every
+# subscribed station and the current SIGMET snapshot version; a pair is
+# only recomputed when one of its inputs changed, and only the diff is
+# pushed. Work scales with data changes, not clients x poll rate.
+import asyncio
+import json
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+LIVE_POLL_SECONDS = 30.0
+HEARTBEAT_SECONDS = 15.0
+SUBSCRIBER_QUEUE_SIZE = 8
+
+Pair = Tuple[str, str]
+# (station -> input version, area version, shared context handed to compute)
+LiveInputs = Tuple[Dict[str, Any], Any, Any]
+
+
+def sse_event(event: str, data: dict, seq: int) -> bytes:
+    return f"id: {seq}\nevent: {event}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+def briefing_view(briefing: dict) -> dict:
+    """The parts of a briefing that subscribers are told about when they change."""
+    enroute = briefing.get("enroute_briefing") or {}
+    dep_metar = (briefing.get("departure_briefing") or {}).get("metar") or {}
+    dest_metar = (briefing.get("destination_briefing") or {}).get("metar") or {}
+    return {
+        "departure_flight_category": dep_metar.get("flight_category"),
+        "destination_flight_category": dest_metar.get("flight_category"),
+        "overall_risk": briefing.get("overall_risk"),
+        "intersecting_sigmets": enroute.get("intersecting_sigmets") or [],
+        "reroute_suggestion": enroute.get("reroute_suggestion"),
+        "error": briefing.get("error"),
+    }
+
+
+def briefing_diff(old: dict, new: dict) -> dict:
+    diff = {
+        key: new[key]
+        for key in ("departure_flight_category", "destination_flight_category", "overall_risk", "reroute_suggestion", "error")
+        if old[key] != new[key]
+    }
+    old_sigmets, new_sigmets = set(old["intersecting_sigmets"]), set(new["intersecting_sigmets"])
+    added = [s for s in new["intersecting_sigmets"] if s not in old_sigmets]
+    cleared = [s for s in old["intersecting_sigmets"] if s not in new_sigmets]
+    if added:
+        diff["new_hazard_intersections"] = added
+    if cleared:
+        diff["cleared_hazard_intersections"] = cleared
+    return diff
+
+
+class PairChannel:
+    __slots__ = ("pair", "subscribers", "inputs_key", "view", "seq", "snapshot_event")
+
+    def __init__(self, pair: Pair):
+        self.pair = pair
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.inputs_key = None
+        self.view: Optional[dict] = None
+        self.seq = 0
+        self.snapshot_event: Optional[bytes] = None
+
+
+class BriefingHub:
+    """
+    ``load_inputs(stations)`` returns per-station input versions (e.g. the
+    raw METAR/TAF text), an area-wide version (the SIGMET snapshot) and a
+    context object; ``compute(departure, destination, context)`` builds a
+    briefing from that context.
+    """
+
+    def __init__(self, load_inputs: Callable[[List[str]], Awaitable[LiveInputs]],
+                 compute: Callable[[str, str, Any], Awaitable[dict]], poll_seconds: float = LIVE_POLL_SECONDS):
+        self._load_inputs = load_inputs
+        self._compute = compute
+        self.poll_seconds = poll_seconds
+        self._channels: Dict[Pair, PairChannel] = {}
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"recomputes": 0, "unchanged": 0, "pushes": 0, "resyncs": 0, "refresh_errors": 0}
+
+    def _send(self, channel: PairChannel, event: bytes):
+        for queue in channel.subscribers:
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Slow client: drop its backlog and resync it with the latest full briefing
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(channel.snapshot_event)
+                self.stats["resyncs"] += 1
+
+    async def _update(self, channel: PairChannel, key, context):
+        departure, destination = channel.pair
+        try:
+            briefing = await self._compute(departure, destination, context)
+        except Exception as e:
+            print(f"Live briefing {departure}-{destination} failed: {e}")
+            briefing = {"error": "Failed to compute briefing."}
+        self.stats["recomputes"] += 1
+        view = briefing_view(briefing)
+        old_view, channel.view, channel.inputs_key = channel.view, view, key
+        channel.seq += 1
+        channel.snapshot_event = sse_event("snapshot", briefing, channel.seq)
+        if old_view is None:
+            self._send(channel, channel.snapshot_event)
+            return
+        diff = briefing_diff(old_view, view)
+        if diff:
+            self._send(channel, sse_event("update", diff, channel.seq))
+            self.stats["pushes"] += len(channel.subscribers)
+
+    async def refresh(self, pairs: Optional[List[Pair]] = None):
+        """Recomputes the given (default: all subscribed) pairs whose inputs changed."""
+        async with self._lock:
+            channels = [self._channels[p] for p in (pairs or list(self._channels)) if p in self._channels]
+            if not channels:
+                return
+            stations = list(dict.fromkeys(code for c in channels for code in c.pair))
+            station_versions, area_version, context = await self._load_inputs(stations)
+            updates = []
+            for channel in channels:
+                departure, destination = channel.pair
+                key = (station_versions.get(departure), station_versions.get(destination), area_version)
+                if key == channel.inputs_key:
+                    self.stats["unchanged"] += 1
+                else:
+                    updates.append(self._update(channel, key, context))
+            await asyncio.gather(*updates)
+
+    async def subscribe(self, pair: Pair) -> asyncio.Queue:
+        channel = self._channels.get(pair)
+        if channel is None:
+            channel = self._channels[pair] = PairChannel(pair)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        channel.subscribers.add(queue)
+        if channel.snapshot_event is not None:
+            queue.put_nowait(channel.snapshot_event)
+            return queue
+        try:
+            # The first computation sends the snapshot to every subscriber waiting on it
+            await self.refresh([pair])
+        except asyncio.CancelledError:
+            self.unsubscribe(pair, queue)
+            raise
+        except Exception as e:
+            # The poll loop retries; the subscriber gets the snapshot once it succeeds
+            self.stats["refresh_errors"] += 1
+            print(f"Live briefing refresh failed: {e}")
+        return queue
+
+    def unsubscribe(self, pair: Pair, queue: asyncio.Queue):
+        channel = self._channels.get(pair)
+        if channel is None:
+            return
+        channel.subscribers.discard(queue)
+        if not channel.subscribers:
+            del self._channels[pair]
+
+    async def stream(self, pair: Pair, expires_at: Optional[float] = None):
+        """SSE byte stream for one subscriber; ends when its token expires."""
+        queue = await self.subscribe(pair)
+        try:
+            while expires_at is None or time.time() < expires_at:
+                try:
+                    yield await asyncio.wait_for(queue.get(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+            yield sse_event("expired", {"detail": "Token expired"}, 0)
+        finally:
+            self.unsubscribe(pair, queue)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            try:
+                await self.refresh()
+            except Exception as e:
+                self.stats["refresh_errors"] += 1
+                print(f"Live briefing refresh failed: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot_stats(self) -> dict:
+        return {
+            **self.stats,
+            "channels": len(self._channels),
+            "subscribers": sum(len(c.subscribers) for c in self._channels.values()),
+        }
@@ -2,44 +2,77 @@
 # FINAL VERSION with Authentication, Dynamic Coords, and SIGMET Rerouting
 
 import json
-import re
+import os
 import math
 import asyncio
-import httpx
-import pandas as pd
+import time
 from fastapi import FastAPI, Depends, HTTPException, status, Header
 from fastapi.middleware.cors import CORSMiddleware
-from metar import Metar
-from typing import List, Dict, Optional
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel
+from typing import Callable, List, Dict, Optional, Tuple
 from datetime import datetime, timezone, timedelta
-from geographiclib.geodesic import Geodesic
-from shapely.geometry import LineString, Polygon
+import numpy as np
 
 # --- [NEW] Import Authentication Logic ---
 from auth import (
     authenticate_user, 
     create_access_token, 
     verify_token, 
+    TOKEN_CACHE,
     LoginRequest, 
     Token,
     ACCESS_TOKEN_EXPIRE_MINUTES
 )
+from weather_cache import WeatherCache
+from sigmet_store import HAZARD_NAMES, SigmetStore
+from reroute import haversine_km, reroute_around
+from airport_index import load_airport_index
+from upstream import UpstreamClient
+from route_cache import RouteCache, batch_checkpoints, read_city_pairs
+from analytics import AnalyticsPipeline
+from live_updates import BriefingHub
+from briefing_cache import BriefingCache, CachedBriefing, briefing_version, etag_matches
+from weather_tiles import (
+    FLIGHT_CATEGORIES, MAX_TILES_PER_REQUEST, MAX_ZOOM, NO_REPORT, TILE_TTL_SECONDS, TileCache,
+    airport_type_for_zoom, default_zoom, merge_tiles, tile_bounds, tile_count, tile_xy, tiles_for_bbox
+)
+from parsing import PARSE_CACHE, parse_feed_async, shutdown_parse_pool
+from metrics import REGISTRY
+from tracing import TRACING_ENABLED, SamplingProfiler, TracingMiddleware, span
 
 
-# --- Load Airport Database at Startup ---
-try:
-    AIRPORT_DB = pd.read_csv("airports.csv")
-    AIRPORT_DB = AIRPORT_DB[AIRPORT_DB['type'].isin(['large_airport', 'medium_airport', 'small_airport'])]
-    AIRPORT_DB.set_index('ident', inplace=True)
-    print("✅ Successfully loaded airports.csv into memory.")
-except Exception as e:
-    print(f"❌ Failed to load airports.csv: {e}")
-    AIRPORT_DB = pd.DataFrame()
+# --- Load Airport Index at Startup (see airport_index.py) ---
+AIRPORT_INDEX = load_airport_index("airports.idx", "airports.csv")
 
 # --- Global Variables ---
-AIRPORT_COORDS = {}
 CUSTOM_USER_AGENT = "AeroSentry/1.0 (hackathon.project@example.com)"
-BASE_URL = "https://aviationweather.gov/api/data/"
+# Point AVIATIONWEATHER_BASE_URL at a local stand-in server for testing
+BASE_URL = os.environ.get("AVIATIONWEATHER_BASE_URL", "https://aviationweather.gov/api/data/")
+UPSTREAM = UpstreamClient(BASE_URL, CUSTOM_USER_AGENT)
+ROUTE_CACHE = RouteCache()
+# Optional CSV of scheduled "DEP,DEST" city pairs to precompute at startup
+ROUTE_WARMUP_FILE = os.environ.get("ROUTE_WARMUP_FILE", "route_warmup.csv")
+ANALYTICS = AnalyticsPipeline(os.environ.get("ANALYTICS_DB_PATH", "analytics.db"))
+REGISTRY.register_collector("weather_cache", lambda: WEATHER_CACHE.snapshot_stats())
+REGISTRY.register_collector("route_cache", lambda: ROUTE_CACHE.snapshot_stats())
+REGISTRY.register_collector("upstream", lambda: UPSTREAM.stats)
+REGISTRY.register_collector("parse_cache", lambda: PARSE_CACHE.snapshot_stats())
+REGISTRY.register_collector("token_cache", lambda: TOKEN_CACHE.snapshot_stats())
+REGISTRY.register_collector("live_updates", lambda: LIVE_HUB.snapshot_stats())
+REGISTRY.register_collector("briefing_cache", lambda: BRIEFING_CACHE.snapshot_stats())
+REGISTRY.register_collector("weather_tiles", lambda: TILE_CACHE.snapshot_stats())
+STATION_CHUNK_SIZE = 100  # stations per upstream ids= request
+MAX_BATCH_LEGS = 1000
+DEFAULT_CRUISE_SPEED_KT = 450.0  # checkpoint ETAs assume a constant ground speed
+KM_PER_NM = 1.852
+DEPARTURE_ROUNDING_SECONDS = 300  # default departure: now, to the nearest 5 minutes
+DETOUR_SLACK_SECONDS = 3600  # hazards this long after the direct-route arrival can still meet a detour
+# Turbulence and icing are usually avoided with a level change, so they are reported but not routed around
+REROUTE_HAZARD_TYPES = ("TS", "VA")
+WEATHER_CACHE = WeatherCache()
+BRIEFING_CACHE = BriefingCache()
+TILE_CACHE = TileCache()
 
 # --- [NEW] Dependency for Token Verification ---
 async def get_current_user_payload(authorization: Optional[str] = Header(None)):
@@ -60,176 +93,185 @@ async def get_current_user_payload(authorization: Optional[str] = Header(None)):
     payload = verify_token(token)
     return payload
 
-# --- Data Parsing Functions (Unchanged) ---
-def parse_metar_to_json(metar_string: str) -> dict:
-    try:
-        obs = Metar.Metar(metar_string)
-        ceiling_ft = 99999
-        for layer in obs.sky:
-            if layer[0] in ['BKN', 'OVC'] and layer[1]:
-                ceiling_ft = layer[1].value()
-                break
-        vis_miles = obs.vis.value('SM') if obs.vis else 99.0
-        flight_category = "VFR"
-        if vis_miles < 1 or ceiling_ft < 500:
-            flight_category = "LIFR"
-        elif vis_miles < 3 or ceiling_ft < 1000:
-            flight_category = "IFR"
-        elif vis_miles <= 5 or ceiling_ft <= 3000:
-            flight_category = "MVFR"
-        weather_phenomena = []
-        if obs.weather:
-            for w in obs.weather:
-                cleaned = [str(part) for part in w if part is not None]
-                if cleaned:
-                    weather_phenomena.append(" ".join(cleaned))
-        return {
-            "station_id": obs.station_id, "raw": obs.code, "flight_category": flight_category,
-            "wind": {"direction_degrees": obs.wind_dir.value() if obs.wind_dir else None, "speed_knots": obs.wind_speed.value() if obs.wind_speed else 0},
-            "visibility_miles": vis_miles, "ceiling_ft": ceiling_ft, "weather_phenomena": weather_phenomena
-        }
-    except Metar.ParserError as e:
-        return {"error": "Failed to parse METAR string.", "details": str(e)}
-
-def parse_taf_to_json(taf_string: str) -> dict:
-    cleaned_taf = re.sub(r'^TAF(\s(AMD|COR))?\s*', '', taf_string)
-    station_id = cleaned_taf.split(' ')[0]
-    forecasts = []
-    periods = re.split(r'\s(FM\d{6}|TEMPO\s\d{4}/\d{4})\s', cleaned_taf)
-    for i in range(0, len(periods), 2):
-        period_label = periods[i-1] if i > 0 else "Initial Forecast"
-        period_text = periods[i]
-        conditions = {}
-        wind = re.search(r'(\d{3}|VRB)(\d{2,3})(G\d{2,3})?KT', period_text)
-        if wind:
-            conditions['wind_summary'] = wind.group(0)
-        vis = re.search(r'\s(P?6SM|\d{4})\s', period_text)
-        if vis:
-            conditions['visibility_summary'] = vis.group(1).replace('SM', ' mi')
-        conditions['period_label'] = period_label.strip()
-        forecasts.append(conditions)
-    return {"station_id": station_id, "forecasts": forecasts, "raw": taf_string}
-
 # --- Live Data Fetching ---
-async def fetch_live_data(session, data_type: str, airport_codes: List[str]):
+async def fetch_live_data(data_type: str, airport_codes: List[str]):
     airport_string = ",".join(airport_codes)
-    headers = {"User-Agent": CUSTOM_USER_AGENT}
     params = {"ids": airport_string.upper(), "format": "json"}
     try:
-        response = await session.get(f"{BASE_URL}{data_type}", headers=headers, params=params, timeout=15, follow_redirects=True)
-        response.raise_for_status()
-        return response.json()
+        return await UPSTREAM.get_json(data_type, params)
     except Exception as e:
         print(f"API/Network Error for {data_type}: {e}")
         return None
 
-async def fetch_sigmets(session: httpx.AsyncClient):
-    headers = {"User-Agent": CUSTOM_USER_AGENT}
+async def fetch_sigmets():
     try:
-        response = await session.get(f"{BASE_URL}sigmet", headers=headers, params={"format": "json"}, timeout=15)
-        response.raise_for_status()
-        return response.json()
+        return await UPSTREAM.get_json("sigmet", {"format": "json"})
     except Exception as e:
         print(f"API/Network Error for SIGMETs: {e}")
-        return []
-
-def parse_sigmets_to_polygons(sigmet_data: List[Dict]) -> List[Dict]:
-    polygons = []
-    for sigmet in sigmet_data:
-        if 'points' in sigmet and sigmet.get('hazard') == 'TS':
-            coords = [(p['lon'], p['lat']) for p in sigmet['points']]
-            if len(coords) >= 3:
-                polygons.append({
-                    "polygon": Polygon(coords),
-                    "raw_text": sigmet.get('rawSigmet', 'No raw text available.')
-                })
-    return polygons
+        return None
+
+# --- Cached Fetching (see weather_cache.py) ---
+async def fetch_cached_data(data_type: str, airport_codes: List[str]):
+    return await WEATHER_CACHE.get_many(
+        data_type, airport_codes, lambda codes: fetch_live_data(data_type, codes)
+    )
+
+async def fetch_cached_bulk(data_type: str, airport_codes: List[str]):
+    """Like fetch_cached_data, split into chunked ids= requests for large station sets."""
+    chunks = [airport_codes[i:i + STATION_CHUNK_SIZE] for i in range(0, len(airport_codes), STATION_CHUNK_SIZE)]
+    results = await asyncio.gather(*(fetch_cached_data(data_type, chunk) for chunk in chunks))
+    return [item for chunk in results for item in chunk]
+
+async def parse_weather_maps(metar_list, taf_list):
+    # Parsed reports are memoized by raw text (see parsing.py) and shared; treat them as read-only
+    with span("parse_metar"):
+        weather_map = await parse_feed_async("metar", metar_list)
+    with span("parse_taf"):
+        taf_map = await parse_feed_async("taf", taf_list)
+    return weather_map, taf_map
+
+# SIGMETs are refreshed by a background task; handlers only read SIGMET_STORE.current
+SIGMET_STORE = SigmetStore(fetch_sigmets)
 
 # --- Intelligent Route & Geodesic Functions ---
-async def get_coordinates_from_api(icao: str, session=None):
-    icao = icao.upper()
-    if icao in AIRPORT_COORDS:
-        return AIRPORT_COORDS[icao]
-    print(f"Fetching coordinates for {icao} from local OurAirports database...")
-    if icao in AIRPORT_DB.index:
-        row = AIRPORT_DB.loc[icao]
-        lat, lon = float(row['latitude_deg']), float(row['longitude_deg'])
-        AIRPORT_COORDS[icao] = (lat, lon)
-        print(f"Found {icao}: ({lat:.4f}, {lon:.4f})")
-        return (lat, lon)
-    print(f"❌ Airport {icao} not found in local database.")
-    return None
+async def get_coordinates_from_api(icao: str):
+    coords = AIRPORT_INDEX.get(icao)
+    if coords is None:
+        print(f"❌ Airport {icao.upper()} not found in local database.")
+    return coords
 
 def get_dynamic_checkpoints(dep_icao: str, dest_icao: str, interval_km: int = 400) -> List[Dict]:
-    if dep_icao not in AIRPORT_COORDS or dest_icao not in AIRPORT_COORDS:
-        return []
-    lat1, lon1 = AIRPORT_COORDS[dep_icao]
-    lat2, lon2 = AIRPORT_COORDS[dest_icao]
-    geod = Geodesic.WGS84
-    inv = geod.Inverse(lat1, lon1, lat2, lon2)
-    total_dist_meters = inv['s12']
-    total_dist_km = total_dist_meters / 1000.0
-    if total_dist_km <= interval_km:
-        return [{"lat": lat1, "lon": lon1}, {"lat": lat2, "lon": lon2}]
-    num_segments = math.ceil(total_dist_km / interval_km)
-    line = geod.Line(lat1, lon1, inv['azi1'])
-    points = []
-    for i in range(num_segments + 1):
-        dist_for_point = min(i * interval_km * 1000, total_dist_meters)
-        pos = line.Position(dist_for_point)
-        points.append({"lat": pos['lat2'], "lon": pos['lon2']})
-        if dist_for_point == total_dist_meters:
-            break
-    return points
-
-async def find_sigmet_reroute(p_prev: dict, p_next: dict, sigmet_poly: Polygon):
-    lat1, lon1 = p_prev['lat'], p_prev['lon']
-    lat2, lon2 = p_next['lat'], p_next['lon']
-    geod = Geodesic.WGS84
-    inv = geod.Inverse(lat1, lon1, lat2, lon2)
-    line = geod.Line(lat1, lon1, inv['azi1'])
-    midpoint = line.Position(inv['s12'] / 2.0)
-    for direction in [90, -90]:
-        print(f"Hazardous segment detected. Attempting detour 100km to {'right' if direction > 0 else 'left'}...")
-        detour_p = geod.Direct(midpoint['lat2'], midpoint['lon2'], midpoint['azi2'] + direction, 100000)
-        new_point = {"lat": detour_p['lat2'], "lon": detour_p['lon2']}
-        seg1 = LineString([(p_prev['lon'], p_prev['lat']), (new_point['lon'], new_point['lat'])])
-        seg2 = LineString([(new_point['lon'], new_point['lat']), (p_next['lon'], p_next['lat'])])
-        if not seg1.intersects(sigmet_poly) and not seg2.intersects(sigmet_poly):
-            print("✅ Safe detour waypoint found.")
-            return new_point
-    print("❌ Could not find a safe detour waypoint within 100km.")
-    return None
+    key = (dep_icao.upper(), dest_icao.upper(), interval_km)
+    route = ROUTE_CACHE.get(key)
+    if route is None:
+        dep_coords, dest_coords = AIRPORT_INDEX.get(dep_icao), AIRPORT_INDEX.get(dest_icao)
+        if dep_coords is None or dest_coords is None:
+            return []
+        route = batch_checkpoints([(*dep_coords, *dest_coords)], interval_km)[0]
+        ROUTE_CACHE.put(key, route)
+    return [{"lat": lat, "lon": lon} for lat, lon in route.tolist()]
+
+def tag_checkpoint_etas(points: List[Dict], departure_ts: float, cruise_speed_kt: float) -> np.ndarray:
+    """Stamps each checkpoint with its ETA flying the route at ``cruise_speed_kt``; returns the epoch-second ETAs."""
+    coords = np.array([(p['lon'], p['lat']) for p in points], dtype=float).reshape(-1, 2)
+    leg_km = haversine_km(coords[:-1, 0], coords[:-1, 1], coords[1:, 0], coords[1:, 1])
+    elapsed_hours = np.concatenate([[0.0], np.cumsum(leg_km)]) / (cruise_speed_kt * KM_PER_NM)
+    etas = departure_ts + elapsed_hours * 3600
+    for point, eta in zip(points, etas.tolist()):
+        point["eta"] = utc_iso(eta)
+    return etas
+
+def utc_iso(timestamp: Optional[float]) -> Optional[str]:
+    if timestamp is None or not math.isfinite(timestamp):
+        return None
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime("%Y-%m-%dT%H:%MZ")
+
+def default_departure_ts() -> float:
+    """Now, to the nearest DEPARTURE_ROUNDING_SECONDS, so requests close together share a briefing version."""
+    return round(time.time() / DEPARTURE_ROUNDING_SECONDS) * DEPARTURE_ROUNDING_SECONDS
+
+def flight_hazards(sigmet_snapshot, dep_coords, dest_coords, departure_ts: float, cruise_speed_kt: float) -> List[Tuple]:
+    """
+    Identity of every hazard valid at some time during the flight (plus
+    DETOUR_SLACK_SECONDS), sorted. Only these can change the briefing, so they
+    version it instead of the whole snapshot, whose other SIGMETs come and go.
+    """
+    (dep_lat, dep_lon), (dest_lat, dest_lon) = dep_coords, dest_coords
+    flight_seconds = float(haversine_km(dep_lon, dep_lat, dest_lon, dest_lat)) / (cruise_speed_kt * KM_PER_NM) * 3600
+    active = sigmet_snapshot.active_hazards(departure_ts, departure_ts + flight_seconds + DETOUR_SLACK_SECONDS)
+    hazards = sigmet_snapshot.hazards
+    return sorted((hazards[i]["raw_text"], hazards[i]["hazard"], hazards[i]["valid_from"], hazards[i]["valid_to"])
+                  for i in active.tolist())
+
+def parse_flight_plan(departure_time: Optional[str], cruise_speed_kt: Optional[float]):
+    """(departure epoch seconds, cruise speed) from the optional request parameters; see default_departure_ts."""
+    cruise_speed_kt = DEFAULT_CRUISE_SPEED_KT if cruise_speed_kt is None else cruise_speed_kt
+    if not 0 < cruise_speed_kt <= 2000:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="cruise_speed_kt must be between 0 and 2000")
+    if not departure_time:
+        return default_departure_ts(), cruise_speed_kt
+    try:
+        departure = datetime.fromisoformat(departure_time.replace("Z", "+00:00"))
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="departure_time must be an ISO 8601 timestamp, e.g. 2024-06-14T18:30Z")
+    if departure.tzinfo is None:
+        departure = departure.replace(tzinfo=timezone.utc)
+    return departure.timestamp(), cruise_speed_kt
+
+def warm_route_cache(path: str = ROUTE_WARMUP_FILE, interval_km: int = 400) -> int:
+    if not os.path.exists(path):
+        return 0
+    routes = {}
+    for dep_icao, dest_icao in read_city_pairs(path):
+        dep_coords, dest_coords = AIRPORT_INDEX.get(dep_icao), AIRPORT_INDEX.get(dest_icao)
+        if dep_coords and dest_coords:
+            routes[(dep_icao, dest_icao, interval_km)] = (*dep_coords, *dest_coords)
+    count = ROUTE_CACHE.warm(routes)
+    print(f"✅ Warmed route cache with {count} city pairs from {path}.")
+    return count
+
+# --- Text Briefing Templates ---
+# Compiled once at import; rendering only fills in the fields
+BRIEFING_TEXT_TEMPLATE = "\n".join([
+    "🛫 AEROSENTRY MISSION BRIEFING", "=" * 50,
+    "\n📍 DEPARTURE: {dep_icao}", "   Current: {dep_current}", "   Forecast: {dep_forecast}",
+    "\n📍 DESTINATION: {dest_icao}", "   Current: {dest_current}", "   Forecast: {dest_forecast}",
+    "\n🌐 ENROUTE CONDITIONS", "{enroute}",
+    "\n📊 OVERALL RISK: {risk}",
+    "\nℹ️  This briefing is for situational awareness. Consult official sources before flight.",
+]).format
+METAR_TEXT_TEMPLATE = "{category} — Wind {wind_dir} at {wind_speed} kt, Visibility {visibility}, Weather: {weather}".format
+ENROUTE_NOTE_TEMPLATE = "   ⚠️ {note}".format
+ENROUTE_HAZARD_TEMPLATE = "   🌩️ HAZARD DETECTED: Flight path intersects active SIGMET for {hazards}.\n   Recommendation: {recommendation}".format
+ENROUTE_CLEAR_TEXT = "   ✅ No significant enroute weather hazards detected."
+NO_METAR_TEXT = "No METAR available."
+NO_TAF_TEXT = "No TAF available."
+TAF_TEMPO_TEXT = "TEMPO periods may include reduced visibility and/or precipitation."
+TAF_QUIET_TEXT = "No significant temporary changes forecast."
+RISK_TEXT = {"VFR": "VFR – Good", "MVFR": "MVFR – Marginal", "IFR": "IFR – Poor", "LIFR": "LIFR – Very Poor"}
+
+def safe_get(d, keys, default="N/A"):
+    for k in keys:
+        d = d[k] if isinstance(d, dict) and k in d else default
+    return d
+
+def format_metar_text(m) -> str:
+    if not m or "error" in m: return NO_METAR_TEXT
+    wind = m.get("wind") if isinstance(m.get("wind"), dict) else {}
+    vis, wind_dir, wind_spd = m.get("visibility_miles", "N/A"), wind.get("direction_degrees", "N/A"), wind.get("speed_knots", "N/A")
+    return METAR_TEXT_TEMPLATE(
+        category=m.get("flight_category", "N/A"),
+        wind_dir=f"{int(wind_dir):03d}°" if isinstance(wind_dir, (int, float)) and not math.isnan(wind_dir) else "VRB",
+        wind_speed=f"{int(wind_spd)}" if isinstance(wind_spd, (int, float)) else "0",
+        visibility=f"{float(vis):.1f} SM" if isinstance(vis, (int, float)) else "N/A",
+        weather=", ".join(m.get("weather_phenomena", [])) or "None"
+    )
+
+def format_taf_text(t) -> str:
+    if not t or "error" in t: return NO_TAF_TEXT
+    tempo = any(f.get("change_type", "").endswith("TEMPO") for f in t.get("forecasts", []))
+    return TAF_TEMPO_TEXT if tempo else TAF_QUIET_TEXT
+
+def format_enroute_text(enroute: dict) -> str:
+    if enroute.get("note"):
+        return ENROUTE_NOTE_TEMPLATE(note=enroute["note"])
+    if not enroute.get("hazards_detected"):
+        return ENROUTE_CLEAR_TEXT
+    hazard_types = dict.fromkeys(h.get("hazard", "TS") for h in enroute.get("hazard_intersections", []))
+    return ENROUTE_HAZARD_TEMPLATE(
+        hazards=", ".join(HAZARD_NAMES.get(h, h) for h in hazard_types) or HAZARD_NAMES["TS"],
+        recommendation=(enroute.get("reroute_suggestion") or {}).get("reason", "Consult ATC for reroute options.")
+    )
 
 def format_briefing_to_text(briefing: dict) -> str:
-    # This function remains unchanged.
     dep, dest, enroute = briefing["departure_briefing"], briefing["destination_briefing"], briefing["enroute_briefing"]
-    def safe_get(d, keys, default="N/A"):
-        for k in keys:
-            d = d[k] if isinstance(d, dict) and k in d else default
-        return d
-    def format_metar(m):
-        if not m or "error" in m: return "No METAR available."
-        cat, vis, wind_dir, wind_spd = safe_get(m, ["flight_category"]), safe_get(m, ["visibility_miles"]), safe_get(m, ["wind", "direction_degrees"]), safe_get(m, ["wind", "speed_knots"])
-        wx = ", ".join(safe_get(m, ["weather_phenomena"], [])) or "None"
-        wind_dir_str = f"{int(wind_dir):03d}°" if isinstance(wind_dir, (int, float)) and not math.isnan(wind_dir) else "VRB"
-        wind_spd_str = f"{int(wind_spd)}" if isinstance(wind_spd, (int, float)) else "0"
-        vis_str = f"{float(vis):.1f} SM" if isinstance(vis, (int, float)) else "N/A"
-        return f"{cat} — Wind {wind_dir_str} at {wind_spd_str} kt, Visibility {vis_str}, Weather: {wx}"
-    def format_taf(t):
-        if not t or "error" in t: return "No TAF available."
-        return "TEMPO periods may include reduced visibility and/or precipitation." if [f for f in t.get("forecasts", []) if "TEMPO" in f.get("period_label", "")] else "No significant temporary changes forecast."
-    dep_icao, dest_icao = safe_get(dep, ["metar", "station_id"], "DEP"), safe_get(dest, ["metar", "station_id"], "DEST")
-    lines = ["🛫 AEROSENTRY MISSION BRIEFING", "=" * 50, f"\n📍 DEPARTURE: {dep_icao}", f"   Current: {format_metar(dep.get('metar'))}", f"   Forecast: {format_taf(dep.get('taf'))}", f"\n📍 DESTINATION: {dest_icao}", f"   Current: {format_metar(dest.get('metar'))}", f"   Forecast: {format_taf(dest.get('taf'))}", "\n🌐 ENROUTE CONDITIONS"]
-    if enroute.get("note"): lines.append(f"   ⚠️ {enroute['note']}")
-    elif enroute.get("hazards_detected"):
-        lines.append("   🌩️ HAZARD DETECTED: Flight path intersects active SIGMET for Thunderstorms.")
-        lines.append(f"   Recommendation: {enroute.get('reroute_suggestion', {}).get('reason', 'Consult ATC for reroute options.')}")
-    else: lines.append("   ✅ No significant enroute weather hazards detected.")
-    risk_map = {"VFR": "VFR – Good", "MVFR": "MVFR – Marginal", "IFR": "IFR – Poor", "LIFR": "LIFR – Very Poor"}
-    lines.append(f"\n📊 OVERALL RISK: {risk_map.get(briefing.get('overall_risk', 'VFR').upper(), 'Unknown')}")
-    lines.append("\nℹ️  This briefing is for situational awareness. Consult official sources before flight.")
-    return "\n".join(lines)
+    return BRIEFING_TEXT_TEMPLATE(
+        dep_icao=safe_get(dep, ["metar", "station_id"], "DEP"), dest_icao=safe_get(dest, ["metar", "station_id"], "DEST"),
+        dep_current=format_metar_text(dep.get("metar")), dep_forecast=format_taf_text(dep.get("taf")),
+        dest_current=format_metar_text(dest.get("metar")), dest_forecast=format_taf_text(dest.get("taf")),
+        enroute=format_enroute_text(enroute),
+        risk=RISK_TEXT.get(briefing.get("overall_risk", "VFR").upper(), "Unknown")
+    )
 
 # --- FastAPI App ---
 app = FastAPI(title="AeroSentry Live Briefing API")
@@ -237,10 +279,54 @@ app.add_middleware(
     CORSMiddleware, allow_origins=["*"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"]
 )
 
+def preload_shared_state():
+    """
+    Loads read-only state in the server's parent process so forked workers
+    share it copy-on-write instead of each building a copy (see run_backend.py).
+    """
+    warm_route_cache()
+
+    async def load_sigmets():
+        await UPSTREAM.start()
+        try:
+            await SIGMET_STORE.refresh()
+        finally:
+            await UPSTREAM.aclose()
+
+    asyncio.run(load_sigmets())
+
+STARTED = False
+
+@app.on_event("startup")
+async def start_background_tasks():
+    global STARTED
+    await UPSTREAM.start()
+    if not ROUTE_CACHE.stats["warmed"]:
+        warm_route_cache()
+    SIGMET_STORE.start()
+    ANALYTICS.start()
+    LIVE_HUB.start()
+    STARTED = True
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    await LIVE_HUB.stop()
+    await SIGMET_STORE.stop()
+    await ANALYTICS.stop()
+    await UPSTREAM.aclose()
+    shutdown_parse_pool()
+
+if TRACING_ENABLED:
+    app.add_middleware(TracingMiddleware)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    return PlainTextResponse(REGISTRY.render_prometheus(), media_type="text/plain; version=0.0.4")
+
 # --- [NEW] Login Endpoint ---
 @app.post("/login", response_model=Token)
 async def login(request: LoginRequest):
-    user = authenticate_user(request.username, request.password)
+    user = await asyncio.to_thread(authenticate_user, request.username, request.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -265,53 +351,237 @@ async def login(request: LoginRequest):
         "user_data": user_details
     }
 
+@app.get("/airports/nearest")
+async def get_nearest_airports(lat: float, lon: float, k: int = 5, max_km: float = 500.0, payload: dict = Depends(get_current_user_payload)):
+    return {"airports": AIRPORT_INDEX.nearest(lat, lon, k=max(1, min(k, 50)), max_km=max_km)}
+
+# --- Regional Weather Layer (see weather_tiles.py) ---
+def tile_station_rows(zoom: int, x: int, y: int):
+    lat_min, lat_max, lon_min, lon_max = tile_bounds(zoom, x, y)
+    rows = AIRPORT_INDEX.within(lat_min, lat_max, lon_min, lon_max, max_type=airport_type_for_zoom(zoom))
+    # Airports on a tile edge belong to the tile tile_xy puts them in, so merged tiles never repeat one
+    tile_x, tile_y = tile_xy(AIRPORT_INDEX.lat[rows], AIRPORT_INDEX.lon[rows], zoom)
+    return rows[(tile_x == x) & (tile_y == y)]
+
+async def build_weather_tile(zoom: int, x: int, y: int) -> dict:
+    rows = tile_station_rows(zoom, x, y)
+    idents = [AIRPORT_INDEX.ident(row) for row in rows]
+    # Served from WEATHER_CACHE (shared with the briefings) once prefetch_tile_weather has run
+    with span("upstream_fetch"):
+        metar_list = await fetch_cached_bulk("metar", idents)
+    with span("parse_metar"):
+        weather_map = await parse_feed_async("metar", metar_list)
+    category_index = {category: i for i, category in enumerate(FLIGHT_CATEGORIES)}
+    return {
+        "ident": idents,
+        "lat": AIRPORT_INDEX.lat[rows].tolist(),
+        "lon": AIRPORT_INDEX.lon[rows].tolist(),
+        "category": [category_index.get((weather_map.get(ident) or {}).get("flight_category"), NO_REPORT) for ident in idents]
+    }
+
+async def prefetch_tile_weather(zoom: int, tiles: List):
+    """Fetches METARs for every uncached tile in one chunked bulk request instead of one per tile."""
+    missing = TILE_CACHE.missing([(zoom, x, y) for x, y in tiles])
+    if len(missing) > 1:
+        idents = [AIRPORT_INDEX.ident(row) for key in missing for row in tile_station_rows(*key)]
+        with span("upstream_fetch"):
+            await fetch_cached_bulk("metar", idents)
+
+async def get_weather_tile(zoom: int, x: int, y: int) -> dict:
+    return await TILE_CACHE.get_or_build((zoom, x, y), lambda: build_weather_tile(zoom, x, y))
+
+@app.get("/weather/region")
+async def get_region_weather(lat_min: float, lat_max: float, lon_min: float, lon_max: float, zoom: Optional[int] = None,
+                             payload: dict = Depends(get_current_user_payload)):
+    # Flight categories for every station in the box as parallel arrays; lon_min > lon_max crosses the antimeridian
+    if not (-90 <= lat_min < lat_max <= 90 and -180 <= lon_min <= 180 and -180 <= lon_max <= 180):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid bounding box")
+    zoom = default_zoom(lat_min, lat_max, lon_min, lon_max) if zoom is None else zoom
+    if not 0 <= zoom <= MAX_ZOOM:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"zoom must be between 0 and {MAX_ZOOM}")
+    # Counted from the tile ranges, so an oversized box is rejected before any list is built
+    count = tile_count(lat_min, lat_max, lon_min, lon_max, zoom)
+    if count > MAX_TILES_PER_REQUEST:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Bounding box covers {count} tiles at zoom {zoom}; the limit is {MAX_TILES_PER_REQUEST}")
+    tiles = tiles_for_bbox(lat_min, lat_max, lon_min, lon_max, zoom)
+    await prefetch_tile_weather(zoom, tiles)
+    columns = merge_tiles(await asyncio.gather(*(get_weather_tile(zoom, x, y) for x, y in tiles)),
+                          lat_min, lat_max, lon_min, lon_max)
+    return JSONResponse(
+        {"zoom": zoom, "tiles": len(tiles), "count": len(columns["ident"]), "categories": FLIGHT_CATEGORIES, "columns": columns},
+        headers={"Cache-Control": f"private, max-age={TILE_TTL_SECONDS // 2}"}
+    )
+
+@app.get("/weather/tiles/{zoom}/{x}/{y}")
+async def get_weather_tile_endpoint(zoom: int, x: int, y: int, payload: dict = Depends(get_current_user_payload)):
+    # Same tiles as /weather/region, for map layers that request z/x/y themselves
+    if not 0 <= zoom <= MAX_ZOOM or not 0 <= x < 1 << zoom or not 0 <= y < 1 << zoom:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid tile coordinates")
+    tile = await get_weather_tile(zoom, x, y)
+    return JSONResponse(
+        {"zoom": zoom, "x": x, "y": y, "count": len(tile["ident"]), "categories": FLIGHT_CATEGORIES, "columns": tile},
+        headers={"Cache-Control": f"private, max-age={TILE_TTL_SECONDS // 2}"}
+    )
+
+class BriefingLeg(BaseModel):
+    departure: str
+    destination: str
+    departure_time: Optional[str] = None
+    cruise_speed_kt: Optional[float] = None
+
+class BatchBriefingRequest(BaseModel):
+    legs: List[BriefingLeg]
+
 @app.get("/")
 def read_root():
     return {"message": "AeroSentry API is running."}
 
+@app.get("/ready")
+async def readiness():
+    # For load balancers: 503 until this worker can brief without waiting on cold caches
+    checks = {
+        "started": STARTED,
+        "airport_index": len(AIRPORT_INDEX) > 0,
+        "sigmet_snapshot": SIGMET_STORE.current.loaded,
+    }
+    if not all(checks.values()):
+        return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"ready": False, "checks": checks})
+    return {"ready": True, "checks": checks, "worker_pid": os.getpid()}
+
 # --- [MODIFIED] Protected Briefing Endpoint ---
 @app.get("/mission-briefing")
-async def get_mission_briefing(departure: str, destination: str, payload: dict = Depends(get_current_user_payload)):
+async def get_mission_briefing(departure: str, destination: str, payload: dict = Depends(get_current_user_payload), profile: bool = False,
+                               departure_time: Optional[str] = None, cruise_speed_kt: Optional[float] = None,
+                               if_none_match: Optional[str] = Header(None)):
     # Role check: only pilots and admins can access this
     user_role = payload.get("role")
     if user_role not in ["pilot", "admin"]:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Insufficient permissions")
+    departure_ts, cruise_speed_kt = parse_flight_plan(departure_time, cruise_speed_kt)
+    if not profile:
+        return briefing_response(await brief_route(departure, destination, departure_ts, cruise_speed_kt, if_none_match))
 
+    # ?profile=1 (admins only): attach a flame-graph-ready stack dump
+    if user_role != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Profiling requires admin role")
+    with SamplingProfiler() as profiler:
+        # Bypasses the briefing cache so the profile shows the real work
+        entry = await brief_route(departure, destination, departure_ts, cruise_speed_kt, use_cache=False)
+    return {**entry.briefing, "profile": profiler.result()}
+
+def briefing_response(entry: CachedBriefing, render: Optional[Callable[[dict], str]] = None) -> Response:
+    """The JSON briefing (or with ``render``, {"briefing_text": ...}) as pre-encoded bytes, or 304."""
+    # Briefings depend on the caller's credentials: clients may keep them but must revalidate
+    headers = {"Cache-Control": "private, no-cache"}
+    if entry.etag:
+        headers["ETag"] = entry.etag
+    if entry.not_modified:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    body = entry.json_body() if render is None else entry.text_body(render)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+async def brief_route(departure: str, destination: str, departure_ts: Optional[float] = None,
+                      cruise_speed_kt: float = DEFAULT_CRUISE_SPEED_KT, if_none_match: Optional[str] = None,
+                      use_cache: bool = True) -> CachedBriefing:
+    """
+    The briefing for one city pair from BRIEFING_CACHE (see briefing_cache.py),
+    computed on a miss. Returns a not-modified entry without computing anything
+    if ``if_none_match`` already names the current version.
+    """
     departure, destination = departure.upper(), destination.upper()
-    async with httpx.AsyncClient() as session:
-        dep_coords, dest_coords, metar_list, taf_list, sigmet_data = await asyncio.gather(
-            get_coordinates_from_api(departure, session), get_coordinates_from_api(destination, session),
-            fetch_live_data(session, "metar", [departure, destination]), fetch_live_data(session, "taf", [departure, destination]),
-            fetch_sigmets(session)
+    departure_ts = default_departure_ts() if departure_ts is None else departure_ts
+    started = time.perf_counter()
+    with span("upstream_fetch"):
+        dep_coords, dest_coords, metar_list, taf_list, sigmet_snapshot = await asyncio.gather(
+            get_coordinates_from_api(departure), get_coordinates_from_api(destination),
+            fetch_cached_data("metar", [departure, destination]), fetch_cached_data("taf", [departure, destination]),
+            SIGMET_STORE.get()
         )
     if not dep_coords or not dest_coords:
-        return {"error": "Could not retrieve coordinates for the specified airports."}
-
-    weather_map = {item.get('icaoId'): parse_metar_to_json(item.get("rawOb")) for item in metar_list} if metar_list else {}
-    taf_map = {item.get('icaoId'): parse_taf_to_json(item.get("rawTAF")) for item in taf_list} if taf_list else {}
-    sigmet_polygons = parse_sigmets_to_polygons(sigmet_data)
-    enroute_points = get_dynamic_checkpoints(departure, destination)
-    final_route_points, hazards_detected, reroute_suggestion = [], False, None
-    p_prev = None
-    for p_next in enroute_points:
-        if p_prev is None:
-            p_prev = p_next
-            final_route_points.append(p_prev)
-            continue
-        segment = LineString([(p_prev['lon'], p_prev['lat']), (p_next['lon'], p_next['lat'])])
-        for sigmet in sigmet_polygons:
-            if segment.intersects(sigmet['polygon']):
-                hazards_detected = True
-                print(f"Flight segment intersects SIGMET: {sigmet['raw_text']}")
-                if not reroute_suggestion:
-                    new_waypoint = await find_sigmet_reroute(p_prev, p_next, sigmet['polygon'])
-                    if new_waypoint:
-                        final_route_points.append(new_waypoint)
-                        reroute_suggestion = {"reason": "Hazard detected. Automatic detour calculated to avoid active SIGMET."}
-                break
-        final_route_points.append(p_next)
-        p_prev = p_next
-        
+        return CachedBriefing(None, {"error": "Could not retrieve coordinates for the specified airports."})
+
+    fetched = time.perf_counter()
+    version = briefing_version(
+        departure, destination, flight_hazards(sigmet_snapshot, dep_coords, dest_coords, departure_ts, cruise_speed_kt),
+        departure_ts, cruise_speed_kt,
+        {item.get('icaoId'): item.get("rawOb") for item in metar_list},
+        {item.get('icaoId'): item.get("rawTAF") for item in taf_list}
+    )
+    entry = CachedBriefing(version, None)
+    if etag_matches(if_none_match, entry.etag):
+        BRIEFING_CACHE.stats["not_modified"] += 1
+        return entry
+
+    async def compute() -> dict:
+        weather_map, taf_map = await parse_weather_maps(metar_list, taf_list)
+        return await build_mission_briefing(departure, destination, dep_coords, dest_coords, weather_map, taf_map, sigmet_snapshot,
+                                            departure_ts, cruise_speed_kt)
+
+    if use_cache:
+        entry = await BRIEFING_CACHE.get_or_compute((departure, destination, version), compute)
+    else:
+        entry.briefing = await compute()
+    record_briefing_event(departure, destination, entry.briefing, started, fetched)
+    return entry
+
+def record_briefing_event(departure: str, destination: str, briefing: dict, started: float, fetched: float):
+    finished = time.perf_counter()
+    enroute = briefing["enroute_briefing"]
+    ANALYTICS.record(
+        departure, destination, briefing["overall_risk"], enroute["hazards_detected"],
+        enroute["reroute_suggestion"] is not None,
+        (finished - started) * 1000, (fetched - started) * 1000, (finished - fetched) * 1000
+    )
+
+async def build_mission_briefing(departure: str, destination: str, dep_coords, dest_coords,
+                                 weather_map: Dict, taf_map: Dict, sigmet_snapshot,
+                                 departure_ts: Optional[float] = None, cruise_speed_kt: float = DEFAULT_CRUISE_SPEED_KT) -> dict:
+    departure_ts = default_departure_ts() if departure_ts is None else departure_ts
+    with span("checkpoints"):
+        enroute_points = get_dynamic_checkpoints(departure, destination)
+        etas = tag_checkpoint_etas(enroute_points, departure_ts, cruise_speed_kt)
+    with span("hazard_intersection"):
+        # 4D test: only hazards valid while the aircraft flies each segment
+        hazard_hits = sigmet_snapshot.route_hits(enroute_points, etas)
+    hazard_intersections = []
+    for segment_idx, hazard_idx in hazard_hits:
+        hazard = sigmet_snapshot.hazards[hazard_idx]
+        hazard_intersections.append({
+            "segment_index": segment_idx, "raw_text": hazard['raw_text'], "hazard": hazard['hazard'],
+            "segment_eta": enroute_points[segment_idx]["eta"],
+            "valid_from": utc_iso(hazard['valid_from']), "valid_to": utc_iso(hazard['valid_to'])
+        })
+    intersecting_sigmets = list(dict.fromkeys(hit["raw_text"] for hit in hazard_intersections))
+    for raw_text in intersecting_sigmets:
+        print(f"Flight segment intersects SIGMET: {raw_text}")
+
+    final_route_points, reroute_suggestion = enroute_points, None
+    if any(hit["hazard"] in REROUTE_HAZARD_TYPES for hit in hazard_intersections):
+        # Field of the avoidable hazards valid at some point during the flight; the planner
+        # then only avoids each one where it is valid when the aircraft gets there
+        active = sigmet_snapshot.active_hazards(float(etas[0]), float(etas[-1]))
+        active = [i for i in active.tolist() if sigmet_snapshot.hazards[i]['hazard'] in REROUTE_HAZARD_TYPES]
+        # CPU-bound field build and graph search; keep both off the event loop
+        with span("reroute"):
+            reroute = await asyncio.to_thread(reroute_around, sigmet_snapshot, enroute_points, active, etas)
+        if reroute:
+            final_route_points = reroute["points"]
+            etas = tag_checkpoint_etas(final_route_points, departure_ts, cruise_speed_kt)
+            # Hazards over the airports themselves are ignored by the planner, so check what the detour still crosses
+            still_crossed = list(dict.fromkeys(
+                sigmet_snapshot.hazards[hazard_idx]['raw_text']
+                for _, hazard_idx in sigmet_snapshot.route_hits(final_route_points, etas)
+                if sigmet_snapshot.hazards[hazard_idx]['hazard'] in REROUTE_HAZARD_TYPES
+            ))
+            reroute_suggestion = {
+                "reason": "Hazard detected. Automatic detour calculated to avoid active SIGMET." if not still_crossed else
+                          "Hazard detected. Automatic detour calculated, but it still crosses the active SIGMETs listed in unavoidable_sigmets.",
+                "detour_waypoints": reroute["detour_waypoints"],
+                "added_distance_km": reroute["added_distance_km"],
+                "unavoidable_sigmets": still_crossed
+            }
+
     dep_risk, dest_risk = weather_map.get(departure, {}).get("flight_category", "VFR"), weather_map.get(destination, {}).get("flight_category", "VFR")
     risk_levels = {"VFR": 0, "MVFR": 1, "IFR": 2, "LIFR": 3}
     overall_risk_cat = dest_risk if risk_levels.get(dest_risk, 0) > risk_levels.get(dep_risk, 0) else dep_risk
@@ -321,25 +591,130 @@ async def get_mission_briefing(departure: str, destination: str, payload: dict =
         "destination_briefing": {"metar": weather_map.get(destination), "taf": taf_map.get(destination)},
         "enroute_briefing": {
             "path_data": {"start": dep_coords, "end": dest_coords, "color": overall_risk_cat.lower()},
-            "sampled_points": final_route_points, "hazards_detected": hazards_detected,
+            "departure_time": utc_iso(departure_ts), "estimated_arrival": utc_iso(float(etas[-1])) if len(etas) else None,
+            "cruise_speed_kt": cruise_speed_kt,
+            "sampled_points": final_route_points, "hazards_detected": bool(hazard_hits),
+            "hazard_intersections": hazard_intersections, "intersecting_sigmets": intersecting_sigmets,
             "reroute_suggestion": reroute_suggestion
         },
-        "overall_risk": overall_risk_cat
+        "overall_risk": overall_risk_cat,
+        "sigmet_snapshot_version": sigmet_snapshot.version
     }
 
+# --- Live Briefing Updates (Server-Sent Events, see live_updates.py) ---
+async def load_live_inputs(stations: List[str]):
+    # Served from WEATHER_CACHE, so an unchanged feed costs no upstream call
+    metar_list, taf_list, sigmet_snapshot = await asyncio.gather(
+        fetch_cached_bulk("metar", stations), fetch_cached_bulk("taf", stations), SIGMET_STORE.get()
+    )
+    versions = {code: [None, None] for code in stations}
+    for item in metar_list:
+        versions.setdefault(item.get('icaoId'), [None, None])[0] = item.get("rawOb")
+    for item in taf_list:
+        versions.setdefault(item.get('icaoId'), [None, None])[1] = item.get("rawTAF")
+    weather_map, taf_map = await parse_weather_maps(metar_list, taf_list)
+    station_versions = {code: tuple(raws) for code, raws in versions.items()}
+    # Live briefings depart at default_departure_ts, so their ETAs move with it
+    area_version = (sigmet_snapshot.version, default_departure_ts())
+    return station_versions, area_version, (weather_map, taf_map, sigmet_snapshot)
+
+async def compute_live_briefing(departure: str, destination: str, context) -> dict:
+    weather_map, taf_map, sigmet_snapshot = context
+    return await build_mission_briefing(
+        departure, destination, AIRPORT_INDEX.get(departure), AIRPORT_INDEX.get(destination),
+        weather_map, taf_map, sigmet_snapshot
+    )
+
+LIVE_HUB = BriefingHub(load_live_inputs, compute_live_briefing)
+
+async def get_stream_user_payload(token: Optional[str] = None, authorization: Optional[str] = Header(None)):
+    # Browsers' EventSource cannot set headers, so the token may also come as ?token=
+    if token is not None:
+        return verify_token(token)
+    return await get_current_user_payload(authorization)
+
+@app.get("/mission-briefing/live")
+async def stream_mission_briefing(departure: str, destination: str, payload: dict = Depends(get_stream_user_payload)):
+    # Event "snapshot" carries the full briefing; "update" carries only what changed
+    if payload.get("role") not in ["pilot", "admin"]:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Insufficient permissions")
+    pair = (departure.upper(), destination.upper())
+    if pair[0] not in AIRPORT_INDEX or pair[1] not in AIRPORT_INDEX:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Could not retrieve coordinates for the specified airports.")
+    return StreamingResponse(
+        LIVE_HUB.stream(pair, expires_at=payload.get("exp")),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# --- Batch Briefing Endpoint for Fleet Dispatch ---
+@app.post("/mission-briefings/batch")
+async def get_mission_briefings_batch(request: BatchBriefingRequest, payload: dict = Depends(get_current_user_payload)):
+    user_role = payload.get("role")
+    if user_role not in ["pilot", "admin"]:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Insufficient permissions")
+    if not request.legs or len(request.legs) > MAX_BATCH_LEGS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Batch must contain 1 to {MAX_BATCH_LEGS} legs")
+
+    legs = [(leg.departure.upper(), leg.destination.upper()) for leg in request.legs]
+    flight_plans = [parse_flight_plan(leg.departure_time, leg.cruise_speed_kt) for leg in request.legs]
+    # Every station is fetched and parsed once, however many legs share it
+    stations = [code for code in dict.fromkeys(code for leg in legs for code in leg) if code in AIRPORT_INDEX]
+    started = time.perf_counter()
+    with span("upstream_fetch"):
+        metar_list, taf_list, sigmet_snapshot = await asyncio.gather(
+            fetch_cached_bulk("metar", stations), fetch_cached_bulk("taf", stations),
+            SIGMET_STORE.get()
+        )
+    fetched = time.perf_counter()
+    weather_map, taf_map = await parse_weather_maps(metar_list, taf_list)
+
+    async def brief_leg(index: int, departure: str, destination: str) -> dict:
+        result = {"index": index, "departure": departure, "destination": destination}
+        dep_coords, dest_coords = AIRPORT_INDEX.get(departure), AIRPORT_INDEX.get(destination)
+        if not dep_coords or not dest_coords:
+            result["error"] = "Could not retrieve coordinates for the specified airports."
+            return result
+        try:
+            leg_started = time.perf_counter()
+            result["briefing"] = await build_mission_briefing(
+                departure, destination, dep_coords, dest_coords, weather_map, taf_map, sigmet_snapshot, *flight_plans[index]
+            )
+            # The shared fetch counts once per leg as its upstream time
+            record_briefing_event(departure, destination, result["briefing"], leg_started - (fetched - started), leg_started)
+        except Exception as e:
+            print(f"Batch leg {departure}-{destination} failed: {e}")
+            result["error"] = "Failed to compute briefing for this leg."
+        return result
+
+    async def stream_results():
+        # One NDJSON line per leg, in completion order
+        tasks = [asyncio.create_task(brief_leg(i, dep, dest)) for i, (dep, dest) in enumerate(legs)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield json.dumps(await next_done) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
 # --- [MODIFIED] Protected Text Briefing Endpoint ---
 @app.get("/mission-briefing/text")
-async def get_mission_briefing_text(departure: str, destination: str, payload: dict = Depends(get_current_user_payload)):
+async def get_mission_briefing_text(departure: str, destination: str, payload: dict = Depends(get_current_user_payload),
+                                    departure_time: Optional[str] = None, cruise_speed_kt: Optional[float] = None,
+                                    if_none_match: Optional[str] = Header(None)):
     # Role check
     user_role = payload.get("role")
     if user_role not in ["pilot", "admin"]:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Insufficient permissions")
 
-    json_briefing = await get_mission_briefing(departure, destination, payload) # Pass payload to satisfy dependency
-    if "error" in json_briefing:
-        return {"briefing_text": f"Error: {json_briefing['error']}"}
-    text_report = format_briefing_to_text(json_briefing)
-    return {"briefing_text": text_report}
+    # Same cache entry as /mission-briefing; the report is rendered once per briefing version
+    departure_ts, cruise_speed_kt = parse_flight_plan(departure_time, cruise_speed_kt)
+    entry = await brief_route(departure, destination, departure_ts, cruise_speed_kt, if_none_match)
+    if not entry.not_modified and "error" in entry.briefing:
+        return {"briefing_text": f"Error: {entry.briefing['error']}"}
+    return briefing_response(entry, format_briefing_to_text)
 
 # --- [NEW] Example Admin-Only Endpoint ---
 @app.get("/admin/analytics")
@@ -349,14 +724,36 @@ async def get_admin_analytics(payload: dict = Depends(get_current_user_payload))
     if user_role != "admin":
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Requires admin role")
     
-    # In a real app, you would generate real analytics
+    summary = await ANALYTICS.summary()
+    today = summary["today"]
     return {
         "message": f"Welcome Admin, {payload.get('full_name')}!",
-        "total_briefings_today": 128,
-        "reroutes_suggested": 15,
-        "most_frequent_airport": "VOBL"
+        "total_briefings_today": today["briefings"],
+        "reroutes_suggested": today["reroutes"],
+        "most_frequent_airport": summary["top_airports"][0]["airport"] if summary["top_airports"] else "N/A",
+        **summary
+    }
+
+@app.get("/admin/cache-stats")
+async def get_cache_stats(payload: dict = Depends(get_current_user_payload)):
+    if payload.get("role") != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Requires admin role")
+    return {
+        "weather": WEATHER_CACHE.snapshot_stats(),
+        "routes": ROUTE_CACHE.snapshot_stats(),
+        "parsed_reports": PARSE_CACHE.snapshot_stats(),
+        "briefings": BRIEFING_CACHE.snapshot_stats(),
+        "weather_tiles": TILE_CACHE.snapshot_stats(),
+        # Caches are per process; under run_backend.py this is the worker that answered
+        "worker_pid": os.getpid()
     }
 
+@app.get("/admin/upstream-stats")
+async def get_upstream_stats(payload: dict = Depends(get_current_user_payload)):
+    if payload.get("role") != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Requires admin role")
+    return UPSTREAM.snapshot_stats()
+
 # Add to main.py
 @app.post("/api/chat")
 async def chat_with_ai(request: dict, payload: dict = Depends(get_current_user_payload)):
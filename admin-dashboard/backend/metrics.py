@@ -0,0 +1,117 @@
+# metrics.py - Minimal in-process metrics (latency histograms) with Prometheus text export
+#
+# The registry lives in each process. Under run_backend.py every worker
+# keeps its own, so every exported series carries a worker="<pid>" label
+# and a scrape shows only the worker that answered it; sum by the other
+# labels across workers when querying.
+import os
+from bisect import bisect_left
+from typing import Callable, Dict, List, Tuple
+
+METRIC_PREFIX = "aerosentry_"
+
+# Seconds; covers everything from a cache hit to an upstream timeout
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 15.0)
+
+
+class Histogram:
+    """Fixed-bucket histogram; ``observe`` is a bisect and two additions."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def merge(self, other: "Histogram"):
+        for i, c in enumerate(other.counts):
+            self.counts[i] += c
+        self.count += other.count
+        self.sum += other.sum
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th quantile."""
+        if not self.count:
+            return 0.0
+        target, seen = q * self.count, 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= target:
+                return self.buckets[i] if i < len(self.buckets) else float("inf")
+        return float("inf")
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "p50": self.quantile(0.50),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+
+LabelKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.histograms: Dict[LabelKey, Histogram] = {}
+        self.collectors: Dict[str, Callable[[], dict]] = {}
+
+    def register_collector(self, name: str, collect: Callable[[], dict]):
+        """``collect`` returns a flat dict; its numeric values are exported as gauges ``<name>_<key>``."""
+        self.collectors[name] = collect
+
+    def histogram(self, name: str, **labels: str) -> Histogram:
+        key = (name, tuple(sorted(labels.items())))
+        hist = self.histograms.get(key)
+        if hist is None:
+            hist = self.histograms[key] = Histogram()
+        return hist
+
+    def snapshot(self, name: str) -> Dict[str, dict]:
+        """All histograms called ``name``, keyed by their label values."""
+        return {
+            ",".join(f"{k}={v}" for k, v in labels): hist.snapshot()
+            for (hist_name, labels), hist in self.histograms.items() if hist_name == name
+        }
+
+    def render_prometheus(self) -> str:
+        worker = (("worker", str(os.getpid())),)
+        lines: List[str] = []
+        by_name: Dict[str, List[Tuple[Tuple[Tuple[str, str], ...], Histogram]]] = {}
+        for (name, labels), hist in self.histograms.items():
+            by_name.setdefault(name, []).append((labels, hist))
+        for name, series in sorted(by_name.items()):
+            metric = METRIC_PREFIX + name
+            lines.append(f"# TYPE {metric} histogram")
+            for labels, hist in series:
+                labels = worker + labels
+                cumulative = 0
+                for bound, count in zip(hist.buckets + ("+Inf",), hist.counts):
+                    cumulative += count
+                    lines.append(f"{metric}_bucket{_format_labels(labels + (('le', str(bound)),))} {cumulative}")
+                lines.append(f"{metric}_sum{_format_labels(labels)} {hist.sum}")
+                lines.append(f"{metric}_count{_format_labels(labels)} {hist.count}")
+        for name, collect in sorted(self.collectors.items()):
+            for key, value in collect().items():
+                if isinstance(value, (int, float)):
+                    metric = f"{METRIC_PREFIX}{name}_{key}"
+                    lines.append(f"# TYPE {metric} gauge")
+                    lines.append(f"{metric}{_format_labels(worker)} {float(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
@@ -0,0 +1,297 @@
+# parsing.py - Memoized METAR/TAF parsing with a bulk API
+#
+# Parsed reports are cached by their raw text. The same dict object is
+# returned on every hit, so callers must treat results as read-only.
+import asyncio
+import multiprocessing
+import re
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from metar import Metar
+
+PARSE_CACHE_SIZE = 8192
+# Cold feeds bigger than this are parsed in a process pool off the event loop
+PROCESS_POOL_THRESHOLD = 200
+PARSE_POOL_WORKERS = 2
+
+TAF_HEADER = re.compile(r'^TAF(\s(AMD|COR))?\s*')
+WIND = re.compile(r'^(\d{3}|VRB)(\d{2,3})(G\d{2,3})?KT$')
+VISIBILITY = re.compile(r'^(P?\d{1,2}SM|\d/\dSM|\d{4})$')
+WEATHER = re.compile(r'^(\+|-|VC)?(MI|PR|BC|DR|BL|SH|TS|FZ)?(DZ|RA|SN|SG|IC|PL|GR|GS|UP|BR|FG|FU|VA|DU|SA|HZ|PY|PO|SQ|FC|SS|DS)+$')
+ISSUE_TIME = re.compile(r'^(\d{2})(\d{2})(\d{2})Z$')
+VALID_PERIOD = re.compile(r'^(\d{2})(\d{2})/(\d{2})(\d{2})$')
+FROM_GROUP = re.compile(r'^FM(\d{2})(\d{2})(\d{2})$')
+PROB_GROUP = re.compile(r'^PROB(30|40)$')
+
+
+class ParseCache:
+    """Bounded LRU of parsed reports keyed by (kind, raw text)."""
+
+    def __init__(self, max_entries: int = PARSE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], dict]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key: Tuple[str, str]) -> Optional[dict]:
+        parsed = self._entries.get(key)
+        if parsed is None:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        self._entries.move_to_end(key)
+        return parsed
+
+    def put(self, key: Tuple[str, str], parsed: dict):
+        self._entries[key] = parsed
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def snapshot_stats(self) -> dict:
+        return {**self.stats, "entries": len(self._entries)}
+
+
+PARSE_CACHE = ParseCache()
+
+
+# --- Uncached parsers ---
+def _parse_metar(metar_string: str) -> dict:
+    try:
+        obs = Metar.Metar(metar_string)
+        ceiling_ft = 99999
+        for layer in obs.sky:
+            if layer[0] in ['BKN', 'OVC'] and layer[1]:
+                ceiling_ft = layer[1].value()
+                break
+        vis_miles = obs.vis.value('SM') if obs.vis else 99.0
+        flight_category = "VFR"
+        if vis_miles < 1 or ceiling_ft < 500:
+            flight_category = "LIFR"
+        elif vis_miles < 3 or ceiling_ft < 1000:
+            flight_category = "IFR"
+        elif vis_miles <= 5 or ceiling_ft <= 3000:
+            flight_category = "MVFR"
+        weather_phenomena = []
+        if obs.weather:
+            for w in obs.weather:
+                cleaned = [str(part) for part in w if part is not None]
+                if cleaned:
+                    weather_phenomena.append(" ".join(cleaned))
+        return {
+            "station_id": obs.station_id, "raw": obs.code, "flight_category": flight_category,
+            "wind": {"direction_degrees": obs.wind_dir.value() if obs.wind_dir else None, "speed_knots": obs.wind_speed.value() if obs.wind_speed else 0},
+            "visibility_miles": vis_miles, "ceiling_ft": ceiling_ft, "weather_phenomena": weather_phenomena
+        }
+    except Metar.ParserError as e:
+        return {"error": "Failed to parse METAR string.", "details": str(e)}
+
+
+def _resolve_day_hour(day: int, hour: int, minute: int, reference: datetime) -> Optional[datetime]:
+    """
+    TAF times carry only day-of-month; pick the month that puts the time
+    closest to ``reference``. Hour 24 means midnight at the end of the day.
+    """
+    best = None
+    for month_offset in (-1, 0, 1):
+        year, month = reference.year, reference.month + month_offset
+        if month == 0:
+            year, month = year - 1, 12
+        elif month == 13:
+            year, month = year + 1, 1
+        try:
+            candidate = datetime(year, month, day, 0, minute, tzinfo=timezone.utc) + timedelta(hours=hour)
+        except ValueError:
+            continue
+        if best is None or abs(candidate - reference) < abs(best - reference):
+            best = candidate
+    return best
+
+
+def _valid_period(token: str, reference: datetime) -> Tuple[Optional[datetime], Optional[datetime]]:
+    m = VALID_PERIOD.match(token)
+    if not m:
+        return None, None
+    start = _resolve_day_hour(int(m.group(1)), int(m.group(2)), 0, reference)
+    end = _resolve_day_hour(int(m.group(3)), int(m.group(4)), 0, start or reference)
+    return start, end
+
+
+def _iso(moment: Optional[datetime]) -> Optional[str]:
+    return moment.strftime("%Y-%m-%dT%H:%MZ") if moment else None
+
+
+def _summarise_period(tokens: List[str]) -> dict:
+    conditions = {}
+    weather = []
+    for token in tokens:
+        if 'wind_summary' not in conditions and WIND.match(token):
+            conditions['wind_summary'] = token
+        elif 'visibility_summary' not in conditions and VISIBILITY.match(token):
+            conditions['visibility_summary'] = token.replace('SM', ' mi')
+        elif WEATHER.match(token):
+            weather.append(token)
+    if weather:
+        conditions['weather'] = weather
+    return conditions
+
+
+def _parse_taf(taf_string: str, reference: Optional[datetime] = None) -> dict:
+    """
+    Splits a TAF into its base forecast and FM/BECMG/TEMPO/PROB change
+    groups, each with a resolved UTC validity window.
+    """
+    reference = reference or datetime.now(timezone.utc)
+    tokens = TAF_HEADER.sub('', taf_string or '').split()
+    if "RMK" in tokens:
+        tokens = tokens[:tokens.index("RMK")]
+    if not tokens:
+        return {"error": "Failed to parse TAF string.", "raw": taf_string}
+    station_id = tokens[0]
+    i = 1
+    issued = None
+    if i < len(tokens) and ISSUE_TIME.match(tokens[i]):
+        m = ISSUE_TIME.match(tokens[i])
+        issued = _resolve_day_hour(int(m.group(1)), int(m.group(2)), int(m.group(3)), reference)
+        i += 1
+    valid_from, valid_to = None, None
+    if i < len(tokens) and VALID_PERIOD.match(tokens[i]):
+        valid_from, valid_to = _valid_period(tokens[i], issued or reference)
+        i += 1
+
+    # Each group: (change_type, label, start, end, body tokens)
+    groups = [["BASE", "Initial Forecast", valid_from, valid_to, []]]
+    while i < len(tokens):
+        token = tokens[i]
+        fm, prob = FROM_GROUP.match(token), PROB_GROUP.match(token)
+        if fm:
+            start = _resolve_day_hour(int(fm.group(1)), int(fm.group(2)), int(fm.group(3)), valid_from or reference)
+            groups.append(["FM", token, start, valid_to, []])
+        elif token in ("TEMPO", "BECMG") or prob:
+            change_type = token
+            if prob and i + 1 < len(tokens) and tokens[i + 1] == "TEMPO":
+                i += 1
+                change_type += " TEMPO"
+            label, start, end = change_type, None, None
+            if i + 1 < len(tokens) and VALID_PERIOD.match(tokens[i + 1]):
+                i += 1
+                label = f"{change_type} {tokens[i]}"
+                start, end = _valid_period(tokens[i], valid_from or reference)
+            groups.append([change_type, label, start, end, []])
+        else:
+            groups[-1][4].append(token)
+        i += 1
+
+    forecasts = []
+    for index, (change_type, label, start, end, body) in enumerate(groups):
+        # An FM group runs until the next FM group replaces it
+        if change_type == "FM":
+            later = [g[2] for g in groups[index + 1:] if g[0] == "FM" and g[2]]
+            end = later[0] if later else end
+        conditions = _summarise_period(body)
+        conditions.update({
+            "period_label": label, "change_type": change_type,
+            "valid_from": _iso(start), "valid_to": _iso(end)
+        })
+        forecasts.append(conditions)
+    return {
+        "station_id": station_id, "issue_time": _iso(issued),
+        "valid_from": _iso(valid_from), "valid_to": _iso(valid_to),
+        "forecasts": forecasts, "raw": taf_string
+    }
+
+
+_PARSERS = {"metar": _parse_metar, "taf": _parse_taf}
+
+
+# --- Memoized single-report API ---
+def parse_metar_to_json(metar_string: str) -> dict:
+    return _parse_cached("metar", metar_string)
+
+
+def parse_taf_to_json(taf_string: str) -> dict:
+    return _parse_cached("taf", taf_string)
+
+
+def _parse_cached(kind: str, raw: str) -> dict:
+    key = (kind, raw)
+    parsed = PARSE_CACHE.get(key)
+    if parsed is None:
+        parsed = _PARSERS[kind](raw)
+        PARSE_CACHE.put(key, parsed)
+    return parsed
+
+
+# --- Bulk API ---
+RAW_FIELDS = {"metar": "rawOb", "taf": "rawTAF"}
+
+
+def _parse_many(kind: str, raws: List[str]) -> List[dict]:
+    """Process-pool entry point: parses without touching the (per-process) cache."""
+    parser = _PARSERS[kind]
+    return [parser(raw) for raw in raws]
+
+
+def _split_feed(kind: str, items: Iterable[dict]) -> Tuple[Dict[str, str], Dict[str, dict], List[str]]:
+    """
+    Maps station -> raw text, and finds the cached parses and the distinct
+    raw texts still to parse. Items without a raw report are left out, so
+    their station reads as having no data.
+    """
+    field = RAW_FIELDS[kind]
+    raw_by_station = {item.get('icaoId'): item.get(field) for item in items or [] if (item.get(field) or "").strip()}
+    parsed, pending = {}, []
+    for raw in dict.fromkeys(raw_by_station.values()):
+        cached = PARSE_CACHE.get((kind, raw))
+        if cached is None:
+            pending.append(raw)
+        else:
+            parsed[raw] = cached
+    return raw_by_station, parsed, pending
+
+
+def parse_feed(kind: str, items: Iterable[dict]) -> Dict[str, dict]:
+    """Parses a whole upstream feed in one pass; each distinct report is parsed once."""
+    raw_by_station, parsed, pending = _split_feed(kind, items)
+    for raw, result in zip(pending, _parse_many(kind, pending)):
+        PARSE_CACHE.put((kind, raw), result)
+        parsed[raw] = result
+    return {station: parsed[raw] for station, raw in raw_by_station.items()}
+
+
+_POOL: Optional[ProcessPoolExecutor] = None
+
+
+def _pool() -> ProcessPoolExecutor:
+    global _POOL
+    if _POOL is None:
+        # spawn: never fork a process that is running an event loop and threads
+        _POOL = ProcessPoolExecutor(max_workers=PARSE_POOL_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _POOL
+
+
+async def parse_feed_async(kind: str, items: Iterable[dict]) -> Dict[str, dict]:
+    """``parse_feed`` that hands large cold feeds to the process pool."""
+    raw_by_station, parsed, pending = _split_feed(kind, items)
+    if len(pending) <= PROCESS_POOL_THRESHOLD:
+        results = _parse_many(kind, pending)
+    else:
+        loop = asyncio.get_running_loop()
+        chunk = -(-len(pending) // PARSE_POOL_WORKERS)
+        chunks = [pending[i:i + chunk] for i in range(0, len(pending), chunk)]
+        parts = await asyncio.gather(*(loop.run_in_executor(_pool(), _parse_many, kind, c) for c in chunks))
+        results = [result for part in parts for result in part]
+    for raw, result in zip(pending, results):
+        PARSE_CACHE.put((kind, raw), result)
+        parsed[raw] = result
+    return {station: parsed[raw] for station, raw in raw_by_station.items()}
+
+
+def shutdown_parse_pool():
+    global _POOL
+    if _POOL is not None:
+        _POOL.shutdown(wait=False, cancel_futures=True)
+        _POOL = None
@@ -0,0 +1,230 @@
+# reroute.py - Visibility-graph detour planner around SIGMET hazard polygons
+import heapq
+import math
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import shapely
+from shapely import STRtree
+
+# Geometry is planar lon/lat, matching the route/SIGMET intersection test
+HAZARD_BUFFER_DEG = 0.25        # ~25 km lateral clearance around each hazard
+SIMPLIFY_TOLERANCE_DEG = 0.05
+NODE_MARGIN_DEG = 0.02          # graph vertices sit just outside the buffered hazard
+SEARCH_MARGIN_DEG = 5.0         # obstacles considered around a blocked stretch of route
+MAX_GRAPH_NODES = 400
+TIME_BUDGET_SECONDS = 2.0
+EARTH_RADIUS_KM = 6371.0088
+FIELD_CACHE_SIZE = 8
+
+
+def haversine_km(lon1, lat1, lon2, lat2):
+    lon1, lat1, lon2, lat2 = map(np.radians, (lon1, lat1, lon2, lat2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class ObstacleField:
+    """
+    Buffered hazard polygons for one SIGMET snapshot plus the candidate
+    graph vertices around each of them. Built once per snapshot version and
+    set of active hazards, and shared by every request. Hazards are kept as
+    separate obstacles (not merged), so a hazard over an airport, or one
+    not valid while the aircraft is nearby, can be ignored without also
+    dropping the neighbours it overlaps.
+    """
+
+    def __init__(self, hazards: Sequence[Dict]):
+        polygons = [h["polygon"] for h in hazards]
+        hazard_of = np.empty(0, dtype=int)
+        if polygons:
+            buffered = shapely.buffer(np.array(polygons, dtype=object), HAZARD_BUFFER_DEG,
+                                      join_style="mitre", mitre_limit=2.0)
+            parts, hazard_of = shapely.get_parts(buffered, return_index=True)
+            # Simplify, then grow by the tolerance again so the result still covers the buffer
+            parts = shapely.buffer(shapely.simplify(parts, SIMPLIFY_TOLERANCE_DEG), SIMPLIFY_TOLERANCE_DEG,
+                                   join_style="mitre", mitre_limit=2.0)
+            self.obstacles = shapely.polygons(shapely.get_exterior_ring(parts))
+        else:
+            self.obstacles = np.array([], dtype=object)
+        # Validity window of the hazard behind each obstacle, open-ended if unknown
+        self.valid_from = np.array([-math.inf if hazards[i].get("valid_from") is None else hazards[i]["valid_from"]
+                                    for i in hazard_of.tolist()], dtype=float)
+        self.valid_to = np.array([math.inf if hazards[i].get("valid_to") is None else hazards[i]["valid_to"]
+                                  for i in hazard_of.tolist()], dtype=float)
+        shapely.prepare(self.obstacles)
+        self.tree = STRtree(self.obstacles)
+        rings = shapely.buffer(self.obstacles, NODE_MARGIN_DEG, join_style="mitre", mitre_limit=2.0)
+        # Drop the closing coordinate of each ring
+        self.vertices = [shapely.get_coordinates(shapely.get_exterior_ring(r))[:-1] for r in rings]
+
+    def inactive(self, start: float, end: float) -> np.ndarray:
+        """Obstacles whose hazard is not valid at any time between ``start`` and ``end``."""
+        return np.flatnonzero((self.valid_from > end) | (self.valid_to < start))
+
+    def blocked(self, lines, ignored: np.ndarray) -> np.ndarray:
+        """Boolean mask of ``lines`` that cross an obstacle not in ``ignored``."""
+        line_idx, obstacle_idx = self.tree.query(lines, predicate="intersects")
+        if len(ignored):
+            line_idx = line_idx[~np.isin(obstacle_idx, ignored)]
+        mask = np.zeros(len(lines), dtype=bool)
+        mask[line_idx] = True
+        return mask
+
+
+_FIELDS: Dict[Tuple[str, Optional[Tuple[int, ...]]], ObstacleField] = {}
+# Fields are built on worker threads (see main.build_mission_briefing)
+_FIELDS_LOCK = threading.Lock()
+
+
+def obstacle_field(snapshot, hazard_ids: Optional[Sequence[int]] = None) -> ObstacleField:
+    """The cached obstacle field for a SIGMET snapshot, optionally limited to ``hazard_ids``."""
+    key = (snapshot.version, None if hazard_ids is None else tuple(sorted(int(i) for i in hazard_ids)))
+    field = _FIELDS.get(key)
+    if field is None:
+        hazards = snapshot.hazards if key[1] is None else [snapshot.hazards[i] for i in key[1]]
+        field = ObstacleField(hazards)
+        with _FIELDS_LOCK:
+            while len(_FIELDS) >= FIELD_CACHE_SIZE:
+                _FIELDS.pop(next(iter(_FIELDS)))
+            _FIELDS[key] = field
+    return field
+
+
+def _graph_nodes(field: ObstacleField, start: np.ndarray, goal: np.ndarray, ignored: np.ndarray) -> np.ndarray:
+    """Start, goal, then vertices of the obstacles nearest the stretch, up to MAX_GRAPH_NODES."""
+    lo, hi = np.minimum(start, goal) - SEARCH_MARGIN_DEG, np.maximum(start, goal) + SEARCH_MARGIN_DEG
+    nearby = field.tree.query(shapely.box(lo[0], lo[1], hi[0], hi[1]))
+    nearby = nearby[~np.isin(nearby, ignored)]
+    corridor = shapely.linestrings([start, goal])
+    nearby = nearby[np.argsort(shapely.distance(field.obstacles[nearby], corridor))]
+    nodes, count = [start[None, :], goal[None, :]], 2
+    for idx in nearby:
+        vertices = field.vertices[idx]
+        if count + len(vertices) > MAX_GRAPH_NODES:
+            break
+        nodes.append(vertices)
+        count += len(vertices)
+    nodes = np.concatenate(nodes)
+    # Vertices that fall inside a neighbouring obstacle can never be used
+    inside = field.blocked(shapely.points(nodes[2:]), ignored)
+    return np.concatenate([nodes[:2], nodes[2:][~inside]])
+
+
+def _shortest_path(field: ObstacleField, nodes: np.ndarray, ignored: np.ndarray, deadline: float) -> Optional[List[int]]:
+    """A* from node 0 to node 1; edges are expanded lazily, one batched query per node."""
+    n = len(nodes)
+    lon, lat = nodes[:, 0], nodes[:, 1]
+    heuristic = haversine_km(lon, lat, lon[1], lat[1])
+    cost = np.full(n, np.inf)
+    cost[0] = 0.0
+    parent = np.full(n, -1)
+    closed = np.zeros(n, dtype=bool)
+    heap = [(heuristic[0], 0)]
+    while heap:
+        if time.monotonic() > deadline:
+            return None
+        _, u = heapq.heappop(heap)
+        if closed[u]:
+            continue
+        if u == 1:
+            path = [1]
+            while path[-1] != 0:
+                path.append(int(parent[path[-1]]))
+            return path[::-1]
+        closed[u] = True
+        candidates = np.flatnonzero(~closed)
+        lines = shapely.linestrings(np.stack([np.broadcast_to(nodes[u], (len(candidates), 2)), nodes[candidates]], axis=1))
+        neighbours = candidates[~field.blocked(lines, ignored)]
+        new_cost = cost[u] + haversine_km(lon[u], lat[u], lon[neighbours], lat[neighbours])
+        improved = new_cost < cost[neighbours]
+        for v, c in zip(neighbours[improved].tolist(), new_cost[improved].tolist()):
+            cost[v] = c
+            parent[v] = u
+            heapq.heappush(heap, (c + heuristic[v], v))
+    return None
+
+
+def _blocked_stretches(n_points: int, blocked_segments: List[int], inside_points: set) -> List[List[int]]:
+    """
+    Groups blocked segments into [first point, last point] stretches whose
+    endpoints are clear of every obstacle where the route allows it.
+    """
+    stretches: List[List[int]] = []
+    for segment in blocked_segments:
+        a, b = segment, segment + 1
+        while a > 0 and a in inside_points:
+            a -= 1
+        while b < n_points - 1 and b in inside_points:
+            b += 1
+        if stretches and a <= stretches[-1][1]:
+            stretches[-1][1] = max(stretches[-1][1], b)
+        else:
+            stretches.append([a, b])
+    return stretches
+
+
+def plan_reroute(points: List[Dict], field: ObstacleField, budget_seconds: float = TIME_BUDGET_SECONDS,
+                 etas: Optional[Sequence[float]] = None) -> Optional[Dict]:
+    """
+    Replaces every stretch of the route that crosses a buffered hazard with
+    the shortest detour through the visibility graph around the hazards.
+    With ``etas`` (epoch seconds at each point) the 4D rule of
+    SigmetSnapshot.route_hits applies: a segment is only blocked by hazards
+    valid while it is flown, and each detour only avoids hazards valid
+    during its stretch. Returns None if any stretch cannot be solved within
+    the compute budget.
+    """
+    if len(points) < 2 or not len(field.obstacles):
+        return None
+    deadline = time.monotonic() + budget_seconds
+    coords = np.array([(p['lon'], p['lat']) for p in points], dtype=float)
+    segments = shapely.linestrings(np.stack([coords[:-1], coords[1:]], axis=1))
+    segment_idx, segment_obstacle = field.tree.query(segments, predicate="intersects")
+    point_idx, point_obstacle = field.tree.query(shapely.points(coords), predicate="intersects")
+    if etas is not None:
+        etas = np.asarray(etas, dtype=float)
+        active = (field.valid_from[segment_obstacle] <= etas[segment_idx + 1]) & \
+                 (field.valid_to[segment_obstacle] >= etas[segment_idx])
+        segment_idx = segment_idx[active]
+        active = (field.valid_from[point_obstacle] <= etas[point_idx]) & (field.valid_to[point_obstacle] >= etas[point_idx])
+        point_idx, point_obstacle = point_idx[active], point_obstacle[active]
+    blocked_segments = sorted(set(segment_idx.tolist()))
+    if not blocked_segments:
+        return None
+    inside_points = set(point_idx.tolist())
+
+    new_points, waypoints, cursor = [], [], 0
+    added_km = 0.0
+    for a, b in _blocked_stretches(len(points), blocked_segments, inside_points):
+        # Hazards sitting on the stretch endpoints (e.g. over the airport) cannot be avoided
+        ignored = point_obstacle[np.isin(point_idx, [a, b])]
+        if etas is not None:
+            # ...and ones not valid while this stretch is flown are not in the way
+            ignored = np.concatenate([ignored, field.inactive(float(etas[a]), float(etas[b]))])
+        ignored = np.unique(ignored)
+        nodes = _graph_nodes(field, coords[a], coords[b], ignored)
+        path = _shortest_path(field, nodes, ignored, deadline)
+        if path is None:
+            print(f"❌ No safe detour found between checkpoints {a} and {b} within the compute budget.")
+            return None
+        detour = [{"lat": float(nodes[i, 1]), "lon": float(nodes[i, 0])} for i in path[1:-1]]
+        direct = haversine_km(coords[a:b, 0], coords[a:b, 1], coords[a + 1:b + 1, 0], coords[a + 1:b + 1, 1]).sum()
+        path_nodes = nodes[path]
+        planned = haversine_km(path_nodes[:-1, 0], path_nodes[:-1, 1], path_nodes[1:, 0], path_nodes[1:, 1]).sum()
+        added_km += float(planned - direct)
+        new_points.extend(points[cursor:a + 1])
+        new_points.extend(detour)
+        waypoints.extend(detour)
+        cursor = b
+    new_points.extend(points[cursor:])
+    print(f"✅ Detour found with {len(waypoints)} waypoints (+{added_km:.0f} km).")
+    return {"points": new_points, "detour_waypoints": waypoints, "added_distance_km": round(max(added_km, 0.0), 1)}
+
+
+def reroute_around(snapshot, points: List[Dict], hazard_ids: Optional[Sequence[int]] = None,
+                   etas: Optional[Sequence[float]] = None) -> Optional[Dict]:
+    """plan_reroute against the snapshot's obstacle field, building it if needed; CPU-bound, run it off the event loop."""
+    return plan_reroute(points, obstacle_field(snapshot, hazard_ids), etas=etas)
@@ -1,13 +1,135 @@
-# run_backend.py
-import uvicorn
+# run_backend.py - Production pre-fork server (use --reload for development)
+#
+# The parent imports the app, loads the read-only state (airport index,
+# route cache, first SIGMET snapshot), binds one listening socket and then
+# forks the workers, so they share that state copy-on-write. Each worker
+# runs its own uvicorn.Server (uvloop/httptools when installed) on the
+# shared socket. SIGTERM/SIGINT drain in-flight requests before exit.
+import argparse
+import gc
+import importlib.util
 import os
+import signal
+import socket
+import sys
+import time
+import uvicorn
+
+RESPAWN_DELAY_SECONDS = 1.0
+
+
+def build_config(app, args) -> uvicorn.Config:
+    return uvicorn.Config(
+        app,
+        loop="uvloop" if importlib.util.find_spec("uvloop") else "asyncio",
+        http="httptools" if importlib.util.find_spec("httptools") else "h11",
+        lifespan="on",
+        log_level=args.log_level,
+        access_log=args.access_log,
+        backlog=args.backlog,
+        timeout_keep_alive=args.keep_alive,
+        timeout_graceful_shutdown=args.graceful_timeout,
+    )
+
+
+def bind_socket(host: str, port: int, backlog: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def spawn_worker(config: uvicorn.Config, sock: socket.socket) -> int:
+    pid = os.fork()
+    if pid:
+        return pid
+    # Worker: uvicorn installs its own SIGTERM/SIGINT handlers for graceful shutdown
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    status = 0
+    try:
+        uvicorn.Server(config).run(sockets=[sock])
+    except BaseException as e:
+        print(f"❌ Worker {os.getpid()} crashed: {e}")
+        status = 1
+    finally:
+        os._exit(status)
+
+
+def serve(args):
+    import main  # imported once here, before fork, so workers inherit it
+
+    print(f"Preloading shared state in parent {os.getpid()}...")
+    main.preload_shared_state()
+    config = build_config(main.app, args)
+    sock = bind_socket(args.host, args.port, args.backlog)
+    # Move everything loaded so far out of the GC's reach so collections in workers don't dirty shared pages
+    gc.collect()
+    gc.freeze()
+
+    workers = {spawn_worker(config, sock) for _ in range(args.workers)}
+    print(f"✅ Serving on {args.host}:{args.port} with {len(workers)} workers "
+          f"(loop={config.loop}, http={config.http}).")
+
+    stopping = False
+
+    def request_stop(signum, frame):
+        nonlocal stopping
+        if not stopping:
+            stopping = True
+            print(f"Draining {len(workers)} workers (up to {args.graceful_timeout}s)...")
+            for pid in workers:
+                os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    deadline = None
+    while workers:
+        if stopping and deadline is None:
+            # uvicorn's own drain timeout plus time for lifespan shutdown
+            deadline = time.monotonic() + args.graceful_timeout + 10
+        try:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid == 0:
+            if deadline is not None and time.monotonic() > deadline:
+                for straggler in workers:
+                    os.kill(straggler, signal.SIGKILL)
+            time.sleep(0.2)
+            continue
+        workers.discard(pid)
+        if not stopping:
+            print(f"⚠️ Worker {pid} exited; starting a replacement.")
+            time.sleep(RESPAWN_DELAY_SECONDS)
+            workers.add(spawn_worker(config, sock))
+    sock.close()
+    print("Server stopped.")
+
+
+def main_entry():
+    parser = argparse.ArgumentParser(description="Run the AeroSentry backend")
+    parser.add_argument("--host", default=os.environ.get("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 8000)))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1)))
+    parser.add_argument("--graceful-timeout", type=int, default=int(os.environ.get("GRACEFUL_TIMEOUT", 30)))
+    parser.add_argument("--keep-alive", type=int, default=5)
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--access-log", action="store_true", help="Log every request (costs throughput)")
+    parser.add_argument("--reload", action="store_true", help="Single-process auto-reloading development server")
+    args = parser.parse_args()
+
+    if args.reload:
+        uvicorn.run("main:app", host=args.host, port=args.port, reload=True, log_level=args.log_level)
+        return
+    if not hasattr(os, "fork"):
+        sys.exit("Pre-fork mode needs os.fork(); use --reload on this platform.")
+    serve(args)
+
 
 if __name__ == "__main__":
-    port = int(os.environ.get("PORT", 8000))
-    uvicorn.run(
-        "main:app",
-        host="0.0.0.0",
-        port=port,
-        reload=True,
-        log_level="info"
-    )
\ No newline at end of file
+    main_entry()
@@ -0,0 +1,234 @@
+# sigmet_store.py - Background SIGMET ingestion with immutable, indexed snapshots
+#
+# Every hazard type in HAZARD_NAMES is kept with its validity window. Besides
+# the plain spatial STRtree, each snapshot holds one STRtree per
+# TIME_BUCKET_SECONDS bucket over the hazards valid during that bucket, so a
+# route whose checkpoints carry ETAs is only tested against hazards that are
+# active when the aircraft gets there.
+import asyncio
+import hashlib
+import json
+import math
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import shapely
+from shapely import STRtree
+from shapely.geometry import Polygon
+
+from tracing import span
+
+REFRESH_INTERVAL_SECONDS = 300
+RETRY_INTERVAL_SECONDS = 30
+TIME_BUCKET_SECONDS = 3600
+# Hazards valid for longer than this (or with no window at all) go in every bucket
+MAX_BUCKETED_SECONDS = 48 * 3600
+
+HAZARD_NAMES = {"TS": "Thunderstorms", "TURB": "Turbulence", "ICE": "Icing", "VA": "Volcanic Ash"}
+# Domestic-feed spellings of the ICAO hazard codes above
+HAZARD_ALIASES = {"CONVECTIVE": "TS", "ASH": "VA"}
+
+
+def _epoch(value) -> Optional[float]:
+    """validTimeFrom/validTimeTo as epoch seconds; the feed sends integers, some mirrors ISO strings."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str) and value:
+        try:
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+    return None
+
+
+def parse_sigmets_to_polygons(sigmet_data: List[Dict]) -> List[Dict]:
+    polygons = []
+    for sigmet in sigmet_data:
+        hazard = str(sigmet.get('hazard') or '').upper()
+        hazard = HAZARD_ALIASES.get(hazard, hazard)
+        if 'points' in sigmet and hazard in HAZARD_NAMES:
+            coords = [(p['lon'], p['lat']) for p in sigmet['points']]
+            if len(coords) >= 3:
+                polygon = Polygon(coords)
+                if not polygon.is_valid:
+                    polygon = shapely.make_valid(polygon)
+                polygons.append({
+                    "polygon": polygon,
+                    "raw_text": sigmet.get('rawSigmet', 'No raw text available.'),
+                    "hazard": hazard,
+                    "valid_from": _epoch(sigmet.get('validTimeFrom')),
+                    "valid_to": _epoch(sigmet.get('validTimeTo'))
+                })
+    return polygons
+
+
+def feed_version(sigmet_data: List[Dict]) -> str:
+    """Content hash of a feed, so an unchanged feed keeps its version."""
+    canonical = json.dumps(sigmet_data, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()[:12]
+
+
+@dataclass(frozen=True)
+class SigmetSnapshot:
+    """
+    One parsed SIGMET feed. Never mutated after publication, so request
+    handlers can read it without locking while the next one is being built.
+    """
+    version: str
+    fetched_at: float
+    hazards: Tuple[Dict, ...]
+    tree: Optional[STRtree]
+    # Validity windows as epoch seconds, -inf/inf where the feed gave none
+    valid_from: np.ndarray = field(default_factory=lambda: np.empty(0))
+    valid_to: np.ndarray = field(default_factory=lambda: np.empty(0))
+    # time bucket -> (STRtree, hazard index of each tree entry)
+    buckets: Dict[int, Tuple[STRtree, np.ndarray]] = field(default_factory=dict)
+    # Hazards valid in every bucket; what a bucket with no entry of its own holds
+    unbucketed: Tuple[Optional[STRtree], np.ndarray] = (None, np.empty(0, dtype=int))
+
+    @property
+    def loaded(self) -> bool:
+        return self.fetched_at > 0
+
+    def route_hits(self, points: List[Dict], etas: Optional[Sequence[float]] = None) -> List[Tuple[int, int]]:
+        """
+        Every (segment index, hazard index) pair where the route segment
+        points[i] -> points[i + 1] intersects a hazard polygon, tested for all
+        segments in one batched STRtree query. With ``etas`` (epoch seconds at
+        each point) a hazard only counts if its validity window overlaps the
+        time the aircraft flies that segment.
+        """
+        if self.tree is None or len(points) < 2:
+            return []
+        coords = np.array([(p['lon'], p['lat']) for p in points], dtype=float)
+        segments = shapely.linestrings(np.stack([coords[:-1], coords[1:]], axis=1))
+        if etas is None:
+            segment_idx, hazard_idx = self.tree.query(segments, predicate="intersects")
+        else:
+            segment_idx, hazard_idx = self._timed_hits(segments, np.asarray(etas, dtype=float))
+        order = np.lexsort((hazard_idx, segment_idx))
+        return list(zip(segment_idx[order].tolist(), hazard_idx[order].tolist()))
+
+    def _timed_hits(self, segments: np.ndarray, etas: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        start, end = etas[:-1], etas[1:]
+        first, last = time_bucket(start), time_bucket(end)
+        found_segments, found_hazards = [], []
+        # One batched query per bucket the flight spans, over the segments flown in it
+        for bucket in range(int(first.min()), int(last.max()) + 1):
+            selected = np.flatnonzero((first <= bucket) & (last >= bucket))
+            tree, members = self.buckets.get(bucket, self.unbucketed)
+            if tree is None or not len(selected):
+                continue
+            segment_idx, member_idx = tree.query(segments[selected], predicate="intersects")
+            found_segments.append(selected[segment_idx])
+            found_hazards.append(members[member_idx])
+        if not found_segments:
+            return np.empty(0, dtype=int), np.empty(0, dtype=int)
+        segment_idx, hazard_idx = np.concatenate(found_segments), np.concatenate(found_hazards)
+        # Buckets are coarse; check the exact windows, then drop pairs seen in several buckets
+        active = (self.valid_from[hazard_idx] <= end[segment_idx]) & (self.valid_to[hazard_idx] >= start[segment_idx])
+        pairs = np.unique(segment_idx[active] * len(self.hazards) + hazard_idx[active])
+        return pairs // len(self.hazards), pairs % len(self.hazards)
+
+    def active_hazards(self, start: float, end: float) -> np.ndarray:
+        """Indices of the hazards valid at any time between ``start`` and ``end``."""
+        return np.flatnonzero((self.valid_from <= end) & (self.valid_to >= start))
+
+
+EMPTY_SNAPSHOT = SigmetSnapshot(version="empty", fetched_at=0.0, hazards=(), tree=None)
+
+
+def time_bucket(timestamps):
+    return np.floor_divide(timestamps, TIME_BUCKET_SECONDS).astype(np.int64)
+
+
+def _bucket_index(geometries: np.ndarray, valid_from: np.ndarray, valid_to: np.ndarray):
+    span_seconds = valid_to - valid_from
+    bucketed = np.isfinite(span_seconds) & (span_seconds <= MAX_BUCKETED_SECONDS)
+    everywhere = np.flatnonzero(~bucketed)
+    members: Dict[int, List[int]] = {}
+    for idx in np.flatnonzero(bucketed).tolist():
+        for bucket in range(int(time_bucket(valid_from[idx])), int(time_bucket(valid_to[idx])) + 1):
+            members.setdefault(bucket, []).append(idx)
+    buckets = {}
+    for bucket, indices in members.items():
+        indices = np.concatenate([np.array(indices, dtype=int), everywhere])
+        buckets[bucket] = (STRtree(geometries[indices]), indices)
+    unbucketed = (STRtree(geometries[everywhere]) if len(everywhere) else None, everywhere)
+    return buckets, unbucketed
+
+
+def build_snapshot(sigmet_data: List[Dict], version: str) -> SigmetSnapshot:
+    with span("sigmet_snapshot_build"):
+        hazards = tuple(parse_sigmets_to_polygons(sigmet_data))
+        geometries = np.array([h["polygon"] for h in hazards], dtype=object)
+        shapely.prepare(geometries)
+        tree = STRtree(geometries) if len(geometries) else None
+        valid_from = np.array([-math.inf if h["valid_from"] is None else h["valid_from"] for h in hazards], dtype=float)
+        valid_to = np.array([math.inf if h["valid_to"] is None else h["valid_to"] for h in hazards], dtype=float)
+        buckets, unbucketed = _bucket_index(geometries, valid_from, valid_to)
+    return SigmetSnapshot(version=version, fetched_at=time.time(), hazards=hazards, tree=tree,
+                          valid_from=valid_from, valid_to=valid_to, buckets=buckets, unbucketed=unbucketed)
+
+
+class SigmetStore:
+    """Keeps ``current`` pointed at the latest SIGMET snapshot."""
+
+    def __init__(self, fetcher: Callable[[], Awaitable[Optional[List[Dict]]]],
+                 interval: float = REFRESH_INTERVAL_SECONDS):
+        self._fetcher = fetcher
+        self.interval = interval
+        self.current: SigmetSnapshot = EMPTY_SNAPSHOT
+        self._refreshing: Optional[asyncio.Task] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def get(self) -> SigmetSnapshot:
+        """The current snapshot; only waits on upstream before the first load."""
+        if self.current.loaded:
+            return self.current
+        return await self.refresh()
+
+    async def refresh(self) -> SigmetSnapshot:
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = asyncio.create_task(self._refresh())
+        return await asyncio.shield(self._refreshing)
+
+    async def _refresh(self) -> SigmetSnapshot:
+        sigmet_data = await self._fetcher()
+        if sigmet_data is None:
+            # Upstream failure: keep serving the last good snapshot
+            return self.current
+        version = feed_version(sigmet_data)
+        if version == self.current.version:
+            return self.current
+        snapshot = await asyncio.to_thread(build_snapshot, sigmet_data, version)
+        self.current = snapshot
+        print(f"SIGMET snapshot {version} published ({len(snapshot.hazards)} hazard polygons).")
+        return snapshot
+
+    async def run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"SIGMET refresh failed: {e}")
+            await asyncio.sleep(self.interval if self.current.loaded else RETRY_INTERVAL_SECONDS)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
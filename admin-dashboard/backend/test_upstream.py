@@ -0,0 +1,93 @@
+# test_upstream.py - Circuit breaker behaviour of the shared upstream client (run with pytest)
+import asyncio
+
+import httpx
+
+from upstream import CircuitBreaker, UpstreamClient, UpstreamError
+
+
+def make_client(handler) -> UpstreamClient:
+    return UpstreamClient("http://upstream.test/", "tests", transport=httpx.MockTransport(handler))
+
+
+def force_half_open(breaker: CircuitBreaker):
+    breaker.failures = breaker.threshold
+    breaker.opened_at = -breaker.reset_seconds
+
+
+def test_allow_reports_the_trial_request():
+    breaker = CircuitBreaker()
+    assert breaker.allow() == (True, False)
+    force_half_open(breaker)
+    assert breaker.allow() == (True, True)
+    assert breaker.allow() == (False, False)
+    breaker.release_trial()
+    assert breaker.allow() == (True, True)
+
+
+def test_request_admitted_while_closed_does_not_free_the_trial():
+    async def scenario():
+        gates = {"slow": asyncio.Event(), "trial": asyncio.Event()}
+
+        async def handler(request):
+            await gates[request.url.params["req"]].wait()
+            return httpx.Response(200, json=[])
+
+        client = make_client(handler)
+        slow = asyncio.create_task(client.get_json("metar", {"req": "slow"}))
+        await asyncio.sleep(0.01)
+        breaker = client._breakers["upstream.test"]
+        # The breaker opens and resets while the slow request is still running
+        force_half_open(breaker)
+        trial = asyncio.create_task(client.get_json("metar", {"req": "trial"}))
+        await asyncio.sleep(0.01)
+
+        gates["slow"].set()
+        await slow
+        # record_success closed the breaker; re-open it to see whether the slot survived
+        force_half_open(breaker)
+        assert breaker.allow() == (False, False)
+
+        gates["trial"].set()
+        await trial
+        assert breaker.state == "closed"
+        await client.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_trial_frees_the_slot():
+    async def scenario():
+        async def handler(request):
+            await asyncio.sleep(10)
+            return httpx.Response(200, json=[])
+
+        client = make_client(handler)
+        breaker = client._breakers.setdefault("upstream.test", CircuitBreaker())
+        force_half_open(breaker)
+        trial = asyncio.create_task(client.get_json("metar"))
+        await asyncio.sleep(0.01)
+        assert breaker.allow() == (False, False)
+        trial.cancel()
+        try:
+            await trial
+        except asyncio.CancelledError:
+            pass
+        assert breaker.allow() == (True, True)
+        await client.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_client_errors_do_not_open_the_breaker():
+    async def scenario():
+        client = make_client(lambda request: httpx.Response(404))
+        for _ in range(CircuitBreaker().threshold + 2):
+            try:
+                await client.get_json("metar")
+            except UpstreamError:
+                pass
+        assert client._breakers["upstream.test"].state == "closed"
+        await client.aclose()
+
+    asyncio.run(scenario())
@@ -0,0 +1,136 @@
+# tracing.py - Per-stage latency spans, Server-Timing and an opt-in sampling profiler
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+
+from starlette.datastructures import MutableHeaders
+
+from metrics import REGISTRY
+
+TRACING_ENABLED = os.environ.get("TRACING_ENABLED", "1") != "0"
+SERVER_TIMING_ENABLED = os.environ.get("SERVER_TIMING_ENABLED", "0") == "1"
+PROFILE_INTERVAL_SECONDS = 0.002
+PROFILE_MAX_DEPTH = 64
+
+# Spans finished in the current request, as (stage, seconds); None outside a traced request
+_request_spans: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("request_spans", default=None)
+
+
+@contextmanager
+def span(stage: str):
+    """Times a pipeline stage into the ``briefing_stage_seconds`` histogram."""
+    if not TRACING_ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        REGISTRY.histogram("briefing_stage_seconds", stage=stage).observe(elapsed)
+        spans = _request_spans.get()
+        if spans is not None:
+            spans.append((stage, elapsed))
+
+
+def begin_request() -> List[Tuple[str, float]]:
+    spans: List[Tuple[str, float]] = []
+    _request_spans.set(spans)
+    return spans
+
+
+def server_timing_header(spans: List[Tuple[str, float]], total: float) -> str:
+    # Repeated stages (e.g. one span per batch leg) are summed
+    totals = Counter()
+    for stage, elapsed in spans:
+        totals[stage] += elapsed
+    entries = [f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in totals.items()]
+    entries.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(entries)
+
+
+class TracingMiddleware:
+    """
+    Pure ASGI middleware timing each HTTP request, up to the start of its
+    response, into ``http_request_seconds`` by route, plus the Server-Timing
+    header when enabled. Only registered when TRACING_ENABLED.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        spans = begin_request()
+        started = time.perf_counter()
+
+        async def send_timed(message):
+            if message["type"] == "http.response.start":
+                elapsed = time.perf_counter() - started
+                route = scope.get("route")
+                REGISTRY.histogram("http_request_seconds", path=getattr(route, "path", "unmatched")).observe(elapsed)
+                if SERVER_TIMING_ENABLED:
+                    MutableHeaders(scope=message).append("Server-Timing", server_timing_header(spans, elapsed))
+            await send(message)
+
+        await self.app(scope, receive, send_timed)
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of every other thread at a fixed interval and
+    aggregates them in collapsed ("folded") format, one
+    ``frame;frame;frame count`` line per distinct stack, ready for
+    flamegraph.pl or speedscope. Samples cover the whole process, so
+    concurrent requests show up too.
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL_SECONDS):
+        self.interval = interval
+        self.samples = 0
+        self._stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def _run(self):
+        own_id = threading.get_ident()
+        names = {}
+        while True:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                if thread_id not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack = []
+                while frame is not None and len(stack) < PROFILE_MAX_DEPTH:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self._stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+            if self._stop.wait(self.interval):
+                break
+
+    def __enter__(self) -> "SamplingProfiler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def result(self) -> dict:
+        return {
+            "format": "collapsed",
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "stacks": [f"{stack} {count}" for stack, count in self._stacks.most_common()],
+        }
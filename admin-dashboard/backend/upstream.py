@@ -0,0 +1,211 @@
+# upstream.py - Shared, resilient HTTP client for aviationweather.gov
+import asyncio
+import random
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+from metrics import REGISTRY
+
+try:
+    import h2  # noqa: F401  (enables httpx HTTP/2 support)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+POOL_LIMITS = httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=30.0)
+REQUEST_TIMEOUT = httpx.Timeout(15.0, connect=5.0)
+PER_HOST_CONCURRENCY = 10
+MAX_RETRIES = 2
+RETRY_BASE_DELAY_SECONDS = 0.25
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RESET_SECONDS = 30.0
+STALE_MAX_AGE_SECONDS = 6 * 3600
+LAST_GOOD_MAX_ENTRIES = 2000
+
+
+class UpstreamError(Exception):
+    pass
+
+
+class CircuitOpenError(UpstreamError):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Opens after ``threshold`` consecutive failures; after ``reset_seconds``
+    a single trial request is let through (half-open) to probe recovery.
+    """
+
+    def __init__(self, threshold: int = BREAKER_FAILURE_THRESHOLD, reset_seconds: float = BREAKER_RESET_SECONDS):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.reset_seconds else "open"
+
+    def allow(self) -> Tuple[bool, bool]:
+        """
+        (allowed, trial). ``trial`` is True only for the request that took the
+        half-open slot; that request, and no other, must call release_trial.
+        """
+        state = self.state
+        if state == "closed":
+            return True, False
+        if state == "half-open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True, True
+        return False, False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.opened_at is not None or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+    def release_trial(self):
+        """Frees the half-open slot; called however the trial request ends, cancellation included."""
+        self._trial_in_flight = False
+
+
+class UpstreamClient:
+    """
+    One application-lifetime ``httpx.AsyncClient`` with keep-alive and
+    HTTP/2, wrapped with per-host concurrency limits, a circuit breaker,
+    jittered retries and a stale-while-error fallback to the last good
+    response for the same request.
+    """
+
+    def __init__(self, base_url: str, user_agent: str, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.base_url = base_url if base_url.endswith("/") else base_url + "/"
+        self.user_agent = user_agent
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._last_good: "OrderedDict[Tuple, Tuple[float, Any]]" = OrderedDict()
+        self.stats = {"requests": 0, "retries": 0, "failures": 0, "stale_served": 0, "short_circuited": 0}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url, http2=HTTP2_AVAILABLE, limits=POOL_LIMITS, timeout=REQUEST_TIMEOUT,
+                headers={"User-Agent": self.user_agent}, follow_redirects=True, transport=self._transport
+            )
+        return self._client
+
+    async def start(self):
+        _ = self.client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        # Semaphores bind to the running loop; a restarted client gets fresh ones
+        self._semaphores.clear()
+
+    def _host(self, path: str) -> str:
+        return urlsplit(str(self.client.base_url.join(path))).netloc
+
+    async def get_json(self, path: str, params: Optional[Dict[str, str]] = None) -> Any:
+        params = params or {}
+        key = (path, tuple(sorted(params.items())))
+        host = self._host(path)
+        breaker = self._breakers.setdefault(host, CircuitBreaker())
+        semaphore = self._semaphores.setdefault(host, asyncio.Semaphore(PER_HOST_CONCURRENCY))
+        allowed, trial = breaker.allow()
+        if not allowed:
+            self.stats["short_circuited"] += 1
+            return self._stale(key, CircuitOpenError(f"Circuit open for {host}"))
+
+        try:
+            data, error, host_failed = await self._fetch(path, params, semaphore)
+        finally:
+            # A request admitted while closed may outlive the reset and finish during
+            # another request's trial; only the trial itself frees the slot
+            if trial:
+                breaker.release_trial()
+        if error is None:
+            breaker.record_success()
+            self._remember(key, data)
+            return data
+        self.stats["failures"] += 1
+        if host_failed:
+            breaker.record_failure()
+        return self._stale(key, error)
+
+    async def _fetch(self, path: str, params: Dict[str, str],
+                     semaphore: asyncio.Semaphore) -> Tuple[Any, Optional[Exception], bool]:
+        """
+        (data, error, host_failed) after up to MAX_RETRIES retries. Only
+        transport errors, 5xx and 429 count against the host's breaker.
+        """
+        latency = REGISTRY.histogram("upstream_request_seconds", endpoint=path)
+        last_error: Exception = UpstreamError(f"No attempt made for {path}")
+        for attempt in range(MAX_RETRIES + 1):
+            if attempt:
+                self.stats["retries"] += 1
+                # Full jitter keeps retries from many requests from synchronising
+                await asyncio.sleep(random.uniform(0, RETRY_BASE_DELAY_SECONDS * 2 ** attempt))
+            self.stats["requests"] += 1
+            start = time.perf_counter()
+            try:
+                async with semaphore:
+                    response = await self.client.get(path, params=params)
+                latency.observe(time.perf_counter() - start)
+                if response.status_code in RETRYABLE_STATUS:
+                    last_error = UpstreamError(f"{path} returned HTTP {response.status_code}")
+                    continue
+                response.raise_for_status()
+                # The API answers 204 when none of the requested stations has a report
+                return (response.json() if response.content else []), None, False
+            except httpx.TransportError as e:
+                latency.observe(time.perf_counter() - start)
+                last_error = e
+                continue
+            except httpx.HTTPStatusError as e:
+                # Not worth retrying; a 4xx means the host itself is answering
+                return None, e, e.response.status_code >= 500
+            except ValueError as e:
+                # Malformed body: not worth retrying, and not a sign the host is down
+                return None, e, False
+        return None, last_error, True
+
+    def _remember(self, key: Tuple, data: Any):
+        self._last_good[key] = (time.time(), data)
+        self._last_good.move_to_end(key)
+        while len(self._last_good) > LAST_GOOD_MAX_ENTRIES:
+            self._last_good.popitem(last=False)
+
+    def _stale(self, key: Tuple, error: Exception) -> Any:
+        entry = self._last_good.get(key)
+        if entry is not None and time.time() - entry[0] <= STALE_MAX_AGE_SECONDS:
+            self.stats["stale_served"] += 1
+            print(f"Upstream error ({error}); serving last good response for {key[0]}.")
+            return entry[1]
+        if isinstance(error, UpstreamError):
+            raise error
+        raise UpstreamError(str(error)) from error
+
+    def snapshot_stats(self) -> dict:
+        return {
+            **self.stats,
+            "http2": HTTP2_AVAILABLE,
+            "circuit_breakers": {host: {"state": b.state, "failures": b.failures} for host, b in self._breakers.items()},
+            "latency_seconds": REGISTRY.snapshot("upstream_request_seconds"),
+        }
@@ -0,0 +1,149 @@
+# weather_cache.py - Shared TTL cache for aviationweather.gov products
+import asyncio
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+# How often each product is normally reissued (seconds). A cached report is
+# kept until its successor is expected, so expiry follows the issuance cycle
+# rather than a fixed wall-clock TTL.
+PRODUCT_CYCLES = {"metar": 3600, "taf": 6 * 3600}
+# Lower bound on a TTL, so a report that is already "due" is not refetched on every request
+MIN_TTL = {"metar": 60, "taf": 300}
+# Stations the upstream has no report for (e.g. small fields without a TAF)
+NEGATIVE_TTL = 300
+MAX_ENTRIES = 20000
+
+CacheKey = Tuple[str, str]
+
+
+class CacheEntry:
+    __slots__ = ("value", "expires_at")
+
+    def __init__(self, value, expires_at: float):
+        self.value = value
+        self.expires_at = expires_at
+
+
+def _issued_at(product: str, item: dict) -> Optional[float]:
+    """Issuance time of a report as epoch seconds, if the feed tells us."""
+    raw = item.get("obsTime") if product == "metar" else item.get("issueTime")
+    if isinstance(raw, (int, float)):
+        return float(raw)
+    if isinstance(raw, str):
+        try:
+            return datetime.fromisoformat(raw.replace("Z", "+00:00")).timestamp()
+        except ValueError:
+            return None
+    return None
+
+
+def expiry_for(product: str, item: Optional[dict], now: float) -> float:
+    """Expect the next report one cycle after this one was issued."""
+    cycle = PRODUCT_CYCLES.get(product, 300)
+    if item is None:
+        return now + NEGATIVE_TTL
+    issued = _issued_at(product, item)
+    expires_at = issued + cycle if issued else now + cycle
+    return min(max(expires_at, now + MIN_TTL.get(product, 60)), now + cycle)
+
+
+class WeatherCache:
+    """
+    Per-(product, station) cache in front of the upstream weather API.
+
+    Concurrent misses for the same key are coalesced: the first caller fetches,
+    everyone else awaits its result. If a refresh fails, the expired entry is
+    served instead (counted as ``stale``).
+    """
+
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: Dict[CacheKey, CacheEntry] = {}
+        self._inflight: Dict[CacheKey, asyncio.Future] = {}
+        self.stats = {"hits": 0, "misses": 0, "stale": 0, "coalesced": 0, "upstream_calls": 0}
+
+    def _store(self, key: CacheKey, value, expires_at: float):
+        if key not in self._entries and len(self._entries) >= self.max_entries:
+            self._evict(time.time())
+        self._entries[key] = CacheEntry(value, expires_at)
+
+    def _evict(self, now: float):
+        expired = [k for k, e in self._entries.items() if e.expires_at <= now]
+        for k in expired:
+            del self._entries[k]
+        # Still full: drop the oldest inserted quarter
+        if len(self._entries) >= self.max_entries:
+            for k in list(self._entries)[: max(1, self.max_entries // 4)]:
+                del self._entries[k]
+
+    def _fallback(self, key: CacheKey):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.stats["stale"] += 1
+            return entry.value
+        return None
+
+    async def get_many(self, product: str, stations: List[str],
+                       fetcher: Callable[[List[str]], Awaitable[Optional[List[dict]]]]) -> List[dict]:
+        """
+        Returns the cached report items for ``stations``, fetching all missing
+        stations in a single ``fetcher`` call.
+        """
+        now = time.time()
+        found: Dict[str, Optional[dict]] = {}
+        waiting: Dict[str, asyncio.Future] = {}
+        to_fetch: List[str] = []
+        for station in dict.fromkeys(s.upper() for s in stations):
+            key = (product, station)
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at > now:
+                self.stats["hits"] += 1
+                found[station] = entry.value
+            elif key in self._inflight:
+                self.stats["coalesced"] += 1
+                waiting[station] = self._inflight[key]
+            else:
+                self.stats["misses"] += 1
+                to_fetch.append(station)
+
+        if to_fetch:
+            loop = asyncio.get_running_loop()
+            futures = {s: loop.create_future() for s in to_fetch}
+            for station, fut in futures.items():
+                self._inflight[(product, station)] = fut
+            fetched: Dict[str, Optional[dict]] = {}
+            items = None
+            try:
+                self.stats["upstream_calls"] += 1
+                items = await fetcher(to_fetch)
+            finally:
+                by_station = {}
+                for item in items or []:
+                    by_station.setdefault(str(item.get("icaoId", "")).upper(), item)
+                fetched_at = time.time()
+                for station, fut in futures.items():
+                    key = (product, station)
+                    if items is None:
+                        value = self._fallback(key)
+                    else:
+                        value = by_station.get(station)
+                        self._store(key, value, expiry_for(product, value, fetched_at))
+                    fetched[station] = value
+                    self._inflight.pop(key, None)
+                    if not fut.done():
+                        fut.set_result(value)
+            found.update(fetched)
+
+        for station, fut in waiting.items():
+            found[station] = await asyncio.shield(fut)
+        return [item for item in found.values() if item is not None]
+
+    def snapshot_stats(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["misses"] + self.stats["coalesced"]
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "hit_ratio": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,173 @@
+# weather_tiles.py - Web Mercator tiling and a per-tile cache for the regional weather layer
+#
+# /weather/region answers a bounding box from the slippy-map tiles (z/x/y)
+# covering it, so a panning map keeps asking for mostly the same tiles and
+# is served from TILE_CACHE rather than upstream. A tile is columnar:
+# parallel arrays of ident, lat, lon and flight category index, which stays
+# compact for thousands of stations. Lower zooms only carry larger
+# airports, so a world view does not fetch every small field.
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+MAX_ZOOM = 12
+MAX_TILES_PER_REQUEST = 64
+TILE_TTL_SECONDS = 120
+TILE_CACHE_SIZE = 4096
+MAX_MERCATOR_LAT = 85.0511287798
+FLIGHT_CATEGORIES = ("VFR", "MVFR", "IFR", "LIFR")
+NO_REPORT = -1
+
+TileKey = Tuple[int, int, int]
+Columns = Dict[str, list]
+
+
+def airport_type_for_zoom(zoom: int) -> int:
+    """Largest airport type index (see airport_index.AIRPORT_TYPES) drawn at ``zoom``."""
+    if zoom < 5:
+        return 0
+    if zoom < 8:
+        return 1
+    return 2
+
+
+def tile_xy(lat, lon, zoom: int):
+    """Tile column/row of each (lat, lon) at ``zoom``."""
+    n = 1 << zoom
+    lat = np.radians(np.clip(lat, -MAX_MERCATOR_LAT, MAX_MERCATOR_LAT))
+    x = np.floor((np.asarray(lon, dtype=float) + 180.0) / 360.0 * n).astype(np.int64)
+    y = np.floor((1.0 - np.arcsinh(np.tan(lat)) / math.pi) / 2.0 * n).astype(np.int64)
+    return np.clip(x, 0, n - 1), np.clip(y, 0, n - 1)
+
+
+def tile_bounds(zoom: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """(lat_min, lat_max, lon_min, lon_max) of a tile."""
+    n = 1 << zoom
+
+    def lat_of(row: int) -> float:
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return lat_of(y + 1), lat_of(y), x / n * 360.0 - 180.0, (x + 1) / n * 360.0 - 180.0
+
+
+def _tile_ranges(lat_min: float, lat_max: float, lon_min: float, lon_max: float, zoom: int) -> Tuple[List[range], range]:
+    """Column ranges (two when the box crosses the antimeridian) and the row range of the box."""
+    (x_lo, x_hi), (y_hi, y_lo) = (v.tolist() for v in tile_xy([lat_min, lat_max], [lon_min, lon_max], zoom))
+    n = 1 << zoom
+    if lon_min <= lon_max:
+        columns = [range(x_lo, x_hi + 1)]
+    elif x_hi >= x_lo:
+        # Both ends fall in the same column: the box wraps all the way round
+        columns = [range(n)]
+    else:
+        columns = [range(x_lo, n), range(0, x_hi + 1)]
+    return columns, range(y_lo, y_hi + 1)
+
+
+def tile_count(lat_min: float, lat_max: float, lon_min: float, lon_max: float, zoom: int) -> int:
+    """Number of tiles tiles_for_bbox returns, without building them."""
+    columns, rows = _tile_ranges(lat_min, lat_max, lon_min, lon_max, zoom)
+    return sum(len(c) for c in columns) * len(rows)
+
+
+def tiles_for_bbox(lat_min: float, lat_max: float, lon_min: float, lon_max: float, zoom: int) -> List[Tuple[int, int]]:
+    """Tiles covering the box; ``lon_min > lon_max`` means it crosses the antimeridian. Check tile_count first."""
+    columns, rows = _tile_ranges(lat_min, lat_max, lon_min, lon_max, zoom)
+    return [(x, y) for y in rows for c in columns for x in c]
+
+
+def default_zoom(lat_min: float, lat_max: float, lon_min: float, lon_max: float) -> int:
+    """
+    Deepest zoom at which the box fits in MAX_TILES_PER_REQUEST tiles. A
+    span of L tiles touches at most L + 2, so at zoom z the box covers at
+    most (w * 2^z + 2) * (h * 2^z + 2) tiles, w and h being its size as a
+    fraction of the world. Solve that for 2^z, then step up while tile
+    alignment still lets a deeper zoom fit.
+    """
+    width = ((lon_max - lon_min) % 360.0 or (0.0 if lon_min == lon_max else 360.0)) / 360.0
+    lat = np.radians(np.clip([lat_max, lat_min], -MAX_MERCATOR_LAT, MAX_MERCATOR_LAT))
+    y_top, y_bottom = ((1.0 - np.arcsinh(np.tan(lat)) / math.pi) / 2.0).tolist()
+    height = y_bottom - y_top
+    # Largest t = 2^z with a*t^2 + b*t + c <= 0
+    a, b, c = width * height, 2 * (width + height), 4 - MAX_TILES_PER_REQUEST
+    t = (math.sqrt(b * b - 4 * a * c) - b) / (2 * a) if a > 0 else -c / b
+    zoom = min(max(int(math.log2(t)), 0), MAX_ZOOM) if t >= 1 else 0
+    while zoom < MAX_ZOOM and tile_count(lat_min, lat_max, lon_min, lon_max, zoom + 1) <= MAX_TILES_PER_REQUEST:
+        zoom += 1
+    return zoom
+
+
+def merge_tiles(tiles: Sequence[Columns], lat_min: float, lat_max: float, lon_min: float, lon_max: float) -> Columns:
+    """Concatenates tile columns, keeping only stations inside the requested box."""
+    if not tiles:
+        return {"ident": [], "lat": [], "lon": [], "category": []}
+    lat = np.concatenate([t["lat"] for t in tiles]).astype(float)
+    lon = np.concatenate([t["lon"] for t in tiles]).astype(float)
+    in_lon = (lon >= lon_min) & (lon <= lon_max) if lon_min <= lon_max else (lon >= lon_min) | (lon <= lon_max)
+    keep = np.flatnonzero((lat >= lat_min) & (lat <= lat_max) & in_lon).tolist()
+    columns = {}
+    for name in ("ident", "lat", "lon", "category"):
+        merged = [value for t in tiles for value in t[name]]
+        columns[name] = [merged[i] for i in keep]
+    return columns
+
+
+class TileCache:
+    """
+    TTL + LRU cache of built tiles keyed by (zoom, x, y). Concurrent misses
+    for the same tile are coalesced as in BriefingCache: the build runs as a
+    task owned by the cache, so cancelling the request that started it does
+    not fail the others waiting on it.
+    """
+
+    def __init__(self, max_entries: int = TILE_CACHE_SIZE, ttl: float = TILE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[TileKey, Tuple[float, Columns]]" = OrderedDict()
+        self._inflight: Dict[TileKey, asyncio.Task] = {}
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0}
+
+    def missing(self, keys: Sequence[TileKey]) -> List[TileKey]:
+        """The keys with no fresh entry and no build in flight."""
+        now = time.time()
+        return [key for key in keys
+                if key not in self._inflight and (key not in self._entries or self._entries[key][0] <= now)]
+
+    async def get_or_build(self, key: TileKey, build: Callable[[], Awaitable[Columns]]) -> Columns:
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.time():
+            self.stats["hits"] += 1
+            self._entries.move_to_end(key)
+            return entry[1]
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+        else:
+            self.stats["misses"] += 1
+            task = self._inflight[key] = asyncio.ensure_future(self._build(key, build))
+        return await asyncio.shield(task)
+
+    async def _build(self, key: TileKey, build: Callable[[], Awaitable[Columns]]) -> Columns:
+        try:
+            tile = await build()
+            self._entries[key] = (time.time() + self.ttl, tile)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+            return tile
+        finally:
+            self._inflight.pop(key, None)
+
+    def snapshot_stats(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["misses"] + self.stats["coalesced"]
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "hit_ratio": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+        }